@@ -67,6 +67,19 @@ if __name__ == "__main__":
         ),
     )
 
+    parser.add_argument(
+        "-i",
+        "--isolate",
+        action="store_true",
+        help="Run each agent in its own process, which is killed when the agent runs out of time",
+    )
+
+    parser.add_argument(
+        "--ponder",
+        action="store_true",
+        help="Let agents think on their opponent's time, implies --isolate",
+    )
+
     args = parser.parse_args()
     p1_path, p1_class = args.player1.split(" ")
     p2_path, p2_class = args.player2.split(" ")
@@ -84,5 +97,7 @@ if __name__ == "__main__":
         board_size=args.board_size,
         logDest=args.log,
         verbose=args.verbose,
+        isolate_agents=args.isolate or args.ponder,
+        ponder=args.ponder,
     )
     g.run()
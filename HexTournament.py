@@ -1,16 +1,29 @@
 import argparse
+import ast
 import csv
 import importlib
+import json
 import logging
+import os
+import queue
 import re
+import secrets
+import signal
+import threading
 import traceback
+from collections import deque
 from datetime import datetime
 from glob import glob
 from itertools import permutations, repeat
-from multiprocessing import Pool, TimeoutError
+from math import floor, log
+from multiprocessing import Pool, Queue
+from multiprocessing.managers import BaseManager
+from time import monotonic
 
 from src.Colour import Colour
 from src.Game import Game, format_result
+from src.Rating import Rating
+from src.SPRT import SPRT
 from src.Player import Player
 from src.EndState import EndState
 
@@ -21,8 +34,14 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-# set the timeout limit in seconds
-TIME_OUT_LIMIT = 1
+# set the wall-clock limit of a game in seconds: both players' move time plus a margin
+TIME_OUT_LIMIT = 2 * Game.MAXIMUM_TIME / 10**9 + 60
+# extra time a coordinator gives a worker node to report a game, in seconds
+NODE_GRACE_PERIOD = 60
+# how often the stats csv is rewritten during a tournament, in seconds
+STATS_FLUSH_INTERVAL = 30
+# relative width of the buckets of the move time histograms
+HISTOGRAM_RESOLUTION = 0.05
 
 fieldnames = [
     "player1",
@@ -35,58 +54,536 @@ fieldnames = [
     "player2_turns",
     "total_turns",
     "total_game_time",
+    "swapped",
 ]
 time = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
 
+# agent classes already imported by this process, keyed by agent string
+agentClasses = {}
+# queue on which a worker announces (game index, pid) when it starts a game
+startedGames = None
 
-def run(games: list[tuple[str, str]]):
+
+def load_agent_class(agent: str) -> type:
+    """Returns the agent class for an agent string such as
+    "agents.Group0.NaiveAgent NaiveAgent", importing its module only the
+    first time it is needed in this process.
+
+    Class attributes can be overridden by appending NAME=value pairs, e.g.
+    "agents.Group17.GoodAgent GoodAgent EXPLORATION_CONSTANT=1.4", to test
+    a tweaked agent against the original.
+    """
+
+    if agent not in agentClasses:
+        agentPath, agentClass, *overrides = agent.split(" ")
+        agentModule = importlib.import_module(agentPath)
+        agentClasses[agent] = getattr(agentModule, agentClass)
+        if overrides:
+            attributes = {}
+            for override in overrides:
+                name, value = override.split("=", 1)
+                attributes[name] = ast.literal_eval(value)
+            agentClasses[agent] = type(agentClass, (agentClasses[agent],), attributes)
+    return agentClasses[agent]
+
+
+def player_names(agentPair: tuple[str, str]) -> tuple[str, str]:
+    """Returns the names the two agents play under: their group names, or
+    the whole agent strings if both agents come from the same group.
+    """
+
+    player1, player2 = agentPair
+    p1Name = player1.split(".")[1]
+    p2Name = player2.split(".")[1]
+    if p1Name == p2Name:
+        return player1, player2
+    return p1Name, p2Name
+
+
+def init_worker(agents: list[str], startedQueue: Queue):
+    """Pool initializer: imports every agent once when the worker starts,
+    so games only pay for constructing the agents. Agents that fail to
+    import are left for run_match to report as a failed load.
+
+    The worker also becomes the leader of a process group, which the agent
+    processes it forks for its games join, so that killing the group kills
+    them with the worker, see play_games.
+    """
+
+    global startedGames
+    startedGames = startedQueue
+
+    os.setpgid(0, 0)
+    # the pool terminates its workers with SIGTERM, e.g. on KeyboardInterrupt
+    signal.signal(signal.SIGTERM, lambda signum, frame: os.killpg(0, signal.SIGKILL))
+
+    for agent in agents:
+        try:
+            load_agent_class(agent)
+        except Exception as error:
+            logger.warning(f"Could not preload {agent}: {repr(error)}")
+
+
+def game_keys(games: list[tuple[str, str]]) -> list[tuple[str, str, int]]:
+    """Returns the journal key of each game: the agent pair and how many
+    times the same pair appears earlier in the list.
+    """
+
+    seen = {}
+    keys = []
+    for agentPair in games:
+        repetition = seen.get(agentPair, 0)
+        seen[agentPair] = repetition + 1
+        keys.append((agentPair[0], agentPair[1], repetition))
+    return keys
+
+
+def read_journal(journalPath: str) -> dict[tuple[str, str, int], dict]:
+    """Reads the results of the games already completed from a tournament
+    journal. A partially written last line, left by a crash, is skipped.
+    """
+
+    completed = {}
+    if not os.path.exists(journalPath):
+        return completed
+
+    with open(journalPath) as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+                completed[(entry["player1"], entry["player2"], entry["repetition"])] = entry["result"]
+            except (json.JSONDecodeError, KeyError):
+                logger.warning(f"Skipping unreadable journal entry: {line.strip()}")
+    return completed
+
+
+class TournamentRecord:
+    """Records the results of a tournament as they come in: the results csv,
+    the error log and, if a journal is given, the journal.
+
+    Games already in the journal are not played again, so an interrupted
+    tournament can be resumed by running it again with the same journal.
+    Games that ended in an error are not journaled and are retried.
+
+    Results are not kept: they are folded into the running stats, which are
+    written to the stats csv every STATS_FLUSH_INTERVAL seconds, and ratings.
+    """
+
+    def __init__(self, games: list[tuple[str, str]], journalPath: str | None = None, listeners: list = ()):
+        self.games = games
+        self.keys = game_keys(games)
+        self.errorGameListPath = f"error_game_list_{time}.log"
+        self.stats = TournamentStats()
+        self.rating = Rating()
+        # called with every result, including those resumed from the journal
+        self.listeners = [self.stats.add_result, self.rating.add_result, *listeners]
+        self._lastFlush = monotonic()
+
+        self.csvFile = open(f"game_results_{time}.csv", "w", newline="")
+        self.writer = csv.DictWriter(self.csvFile, fieldnames=fieldnames)
+        self.writer.writeheader()
+
+        completed = read_journal(journalPath) if journalPath else {}
+        self.pending = []
+        for i, key in enumerate(self.keys):
+            if key in completed:
+                self.writer.writerow(completed[key])
+                for listener in self.listeners:
+                    listener(completed[key])
+            else:
+                self.pending.append(i)
+        if completed:
+            logger.info(f"Resuming from {journalPath}: {len(self.keys) - len(self.pending)} games done, {len(self.pending)} to play")
+        self.csvFile.flush()
+        self.journal = open(journalPath, "a") if journalPath else None
+
+    def record_result(self, i: int, result: dict):
+        self.writer.writerow(result)
+        self.csvFile.flush()
+        if self.journal:
+            player1, player2, repetition = self.keys[i]
+            entry = {"player1": player1, "player2": player2, "repetition": repetition, "result": result}
+            self.journal.write(json.dumps(entry) + "\n")
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+        for listener in self.listeners:
+            listener(result)
+
+        if monotonic() - self._lastFlush > STATS_FLUSH_INTERVAL:
+            self.stats.write()
+            self._lastFlush = monotonic()
+
+    def record_error(self, i: int, message: str):
+        logger.error(f"Error in game between {self.games[i]}: {message}")
+        with open(self.errorGameListPath, "a") as errFile:
+            errFile.write(f"{self.games[i]}, {message}\n")
+
+    def close(self):
+        """Closes the files and exports the stats and ratings over all results."""
+
+        self.csvFile.close()
+        if self.journal:
+            self.journal.close()
+        self.stats.write()
+        export_ratings(self.rating)
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """Parses a shard given as "i/N", with 0 <= i < N."""
+
+    index, count = (int(part) for part in shard.split("/"))
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard {shard}")
+    return index, count
+
+
+def run(
+    games: list[tuple[str, str]],
+    maxTasksPerChild: int | None = None,
+    timeLimit: float = TIME_OUT_LIMIT,
+    journalPath: str | None = None,
+    shard: tuple[int, int] = (0, 1),
+    convergeWidth: float | None = None,
+):
     """Run the tournament. This uses multiprocessing to dispatch each of the game.
     The results are written to a csv file.
     The error will be written to a log file.
 
     Args:
         games (list[tuple[str, str]]): all the games pair that need to be played
+        maxTasksPerChild (int | None): number of games a worker plays before it is
+            replaced by a fresh process, None to keep workers for the whole tournament
+        timeLimit (float): wall-clock limit of a single game in seconds
+        journalPath (str | None): path of the JSON lines tournament journal
+        shard (tuple[int, int]): (i, N) to only play the games whose index is i modulo N,
+            so that N machines can split a tournament between them
+        convergeWidth (float | None): stop starting games once the 95% confidence
+            interval of every rating is within this many Elo points either side
+    """
+    record = TournamentRecord(games, journalPath)
+    shardIndex, shardCount = shard
+    toPlay = iter([(i, games[i]) for i in record.pending if i % shardCount == shardIndex])
+    agents = sorted({agent for agentPair in games for agent in agentPair})
+
+    def next_game():
+        if convergeWidth is not None and record.rating.has_converged(convergeWidth):
+            logger.info(f"Ratings converged to within {convergeWidth} Elo, not starting more games")
+            return None
+        return next(toPlay, None)
+
+    play_games(
+        next_game,
+        agents,
+        maxTasksPerChild,
+        timeLimit,
+        lambda i: None,
+        record.record_result,
+        record.record_error,
+    )
+    record.close()
+
+
+def head_to_head(
+    agentA: str,
+    agentB: str,
+    sprt: SPRT,
+    maxGames: int = 10_000,
+    maxTasksPerChild: int | None = None,
+    timeLimit: float = TIME_OUT_LIMIT,
+    journalPath: str | None = None,
+) -> str:
+    """Plays agentA against agentB, alternating colours, until the SPRT
+    decides whether A is stronger or maxGames have been played. Games
+    already in flight when the test is decided are still recorded.
+
+    Returns:
+        str: the SPRT status, "H1" if A is stronger, "H0" if it is not,
+            or "" if maxGames ran out first
     """
-    resultFilePath = f"game_results_{time}.csv"
-    errorGameListPath = f"error_game_list_{time}.log"
 
-    with open(resultFilePath, "w", newline="") as csvFile:
-        writer = csv.DictWriter(csvFile, fieldnames=fieldnames)
-        writer.writeheader()
+    games = [(agentA, agentB), (agentB, agentA)] * (maxGames // 2)
+    nameA, nameB = player_names((agentA, agentB))
 
-    # Run the tournament
-    gameResults = []
-    with Pool() as pool:
-        # using apply_async to apply the game function to the player pair
-        result = [
-            pool.apply_async(
-                run_match,
-                (agentPair,),
-            )
-            for agentPair in games
-        ]
+    def add_game(result):
+        if result["winner"] in (nameA, nameB):
+            sprt.add_game(result["winner"] == nameA)
 
-        # gather all the results. Error of a game is captured and written to a log file.
-        for i, gameResult in enumerate(result):
+    record = TournamentRecord(games, journalPath, [add_game])
+    toPlay = iter(record.pending)
+
+    def next_game():
+        if sprt.status():
+            return None
+        i = next(toPlay, None)
+        return None if i is None else (i, games[i])
+
+    def on_result(i, result):
+        record.record_result(i, result)
+        logger.info(f"SPRT {sprt}")
+
+    play_games(next_game, [agentA, agentB], maxTasksPerChild, timeLimit, lambda i: None, on_result, record.record_error)
+    record.close()
+
+    status = sprt.status()
+    verdict = {"H1": f"{agentA} is stronger", "H0": f"{agentA} is not stronger"}.get(status, "undecided")
+    logger.info(f"SPRT {verdict}: {sprt}")
+    return status
+
+
+def play_games(nextGame, agents, maxTasksPerChild, timeLimit, onStart, onResult, onError):
+    """Plays games on a local pool of worker processes. Results are handled in
+    the order the games finish, and the worker of a game that runs past the
+    time limit is killed and replaced.
+
+    Args:
+        nextGame: returns the next (game index, agent pair) to play, an empty
+            tuple if there is none available yet, or None when there are no more
+        agents (list[str]): agents to import in every worker at start-up
+        maxTasksPerChild (int | None): number of games a worker plays before it is
+            replaced by a fresh process
+        timeLimit (float): wall-clock limit of a single game in seconds
+        onStart: called with the game index when a worker starts the game
+        onResult: called with the game index and the result dict
+        onError: called with the game index and an error message
+    """
+
+    processes = os.cpu_count()
+    startedQueue = Queue()
+    # filled by the pool's result handler thread as games finish
+    finishedGames = queue.Queue()
+    with Pool(processes, initializer=init_worker, initargs=(agents, startedQueue), maxtasksperchild=maxTasksPerChild) as pool:
+        inFlight = {}
+        # the game each worker is currently playing: pid -> (game index, start time)
+        running = {}
+        exhausted = False
+        while not exhausted or inFlight:
+            # keep every worker busy, with a game queued behind it
+            while not exhausted and len(inFlight) < 2 * processes:
+                game = nextGame()
+                if game is None:
+                    exhausted = True
+                elif not game:
+                    break
+                else:
+                    i, agentPair = game
+                    inFlight[i] = agentPair
+                    pool.apply_async(
+                        play_game,
+                        (i, agentPair),
+                        callback=finishedGames.put,
+                        error_callback=lambda error, i=i: finishedGames.put((i, error)),
+                    )
+
+            try:
+                while True:
+                    i, pid = startedQueue.get_nowait()
+                    if i in inFlight:
+                        running[pid] = (i, monotonic())
+                        onStart(i)
+            except queue.Empty:
+                pass
+
+            # gather the results. Error of a game is captured and written to a log file.
             try:
-                r = gameResult.get(timeout=TIME_OUT_LIMIT)
-                with open(resultFilePath, "a", newline="") as csvFile:
-                    writer = csv.DictWriter(csvFile, fieldnames=fieldnames)
-                    writer.writerow(r)
-                gameResults.append(r)
+                i, r = finishedGames.get(timeout=1)
+            except queue.Empty:
+                pass
+            else:
+                if inFlight.pop(i, None) is not None:
+                    if isinstance(r, Exception):
+                        onError(i, f"{repr(r)}, {''.join(traceback.format_exception(r))}")
+                    else:
+                        onResult(i, r)
+
+            now = monotonic()
+            for pid, (i, start) in list(running.items()):
+                if i not in inFlight:
+                    del running[pid]
+                elif now - start > timeLimit:
+                    # the pool replaces the killed worker. Its agent processes must die
+                    # with it, or they keep running and hold the pool's pipes open
+                    logger.warning(f"Timed out between {inFlight[i]}, killing worker {pid}")
+                    try:
+                        os.killpg(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                    del running[pid]
+                    del inFlight[i]
+                    onError(i, f"TimeoutError('game exceeded {timeLimit}s')")
+
+
+class TournamentManager(BaseManager):
+    """Serves the game leases and message queue of a coordinator to worker nodes."""
+
+
+class GameLeases:
+    """Games of a coordinator, handed out to worker nodes on lease. A game
+    that is not reported before its lease runs out is assumed lost with its
+    node and handed out again. Used by the coordinator and by the manager's
+    server threads, so every method holds a lock.
+    """
+
+    def __init__(self, games: list[tuple[str, str]], pending: list[int], duration: float):
+        self.games = games
+        # lease of a game that has been handed out but not started, in seconds
+        self.duration = duration
+        self._waiting = deque(pending)
+        # game index -> time at which its lease runs out
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def take(self) -> tuple[int, tuple[str, str]] | tuple[()] | None:
+        """Returns the next (game index, agent pair) to play, an empty tuple
+        if every game left is on lease, or None when there are no games left.
+        """
+
+        with self._lock:
+            if self._waiting:
+                i = self._waiting.popleft()
+                self._leases[i] = monotonic() + self.duration
+                return i, self.games[i]
+            return () if self._leases else None
+
+    def renew(self, i: int, duration: float):
+        with self._lock:
+            if i in self._leases:
+                self._leases[i] = monotonic() + duration
+
+    def finish(self, i: int):
+        with self._lock:
+            self._leases.pop(i, None)
+            # the game may have been handed out again after its lease ran out
+            if i in self._waiting:
+                self._waiting.remove(i)
+
+    def expire(self) -> list[int]:
+        """Hands out again the games whose lease has run out, and returns them."""
+
+        with self._lock:
+            now = monotonic()
+            expired = [i for i, end in self._leases.items() if end < now]
+            for i in expired:
+                del self._leases[i]
+                self._waiting.append(i)
+            return expired
+
+
+def serve(
+    games: list[tuple[str, str]],
+    address: tuple[str, int],
+    authKey: bytes,
+    timeLimit: float = TIME_OUT_LIMIT,
+    journalPath: str | None = None,
+):
+    """Coordinates a tournament played by worker nodes, see work. Games are
+    handed out one at a time over a socket, and all results are recorded
+    here.
+
+    A node queues up to twice as many games as it has workers, so a game is
+    handed out on a lease of twice the time limit plus NODE_GRACE_PERIOD:
+    long enough to wait for a running game and be played. Once the node
+    reports the game started, the lease is the time limit plus
+    NODE_GRACE_PERIOD from then. Games whose lease runs out, e.g. because
+    their node died, are handed out again.
+    """
+
+    record = TournamentRecord(games, journalPath)
+    leases = GameLeases(games, record.pending, 2 * timeLimit + NODE_GRACE_PERIOD)
+    messageQueue = queue.Queue()
+
+    TournamentManager.register("get_games", callable=lambda: leases)
+    TournamentManager.register("get_messages", callable=lambda: messageQueue)
+    server = TournamentManager(address=address, authkey=authKey).get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving {len(record.pending)} games on {address[0]}:{address[1]}")
+
+    pending = set(record.pending)
+    while pending:
+        try:
+            message = messageQueue.get(timeout=1)
+        except queue.Empty:
+            message = None
+
+        if message is not None:
+            kind, i, payload = message
+            if i in pending:
+                if kind == "started":
+                    leases.renew(i, timeLimit + NODE_GRACE_PERIOD)
+                else:
+                    pending.discard(i)
+                    leases.finish(i)
+                    if kind == "result":
+                        record.record_result(i, payload)
+                    else:
+                        record.record_error(i, payload)
+
+        for i in leases.expire():
+            logger.warning(f"No result for {games[i]}, handing it out again")
+
+    # nodes asking for games from now on are told that there are none left
+    record.close()
+
+
+def work(address: tuple[str, int], authKey: bytes, agents: list[str], maxTasksPerChild: int | None = None, timeLimit: float = TIME_OUT_LIMIT):
+    """Plays games handed out by a coordinator, see serve, on the local pool
+    until the coordinator runs out of games.
+    """
+
+    TournamentManager.register("get_games")
+    TournamentManager.register("get_messages")
+    manager = TournamentManager(address=address, authkey=authKey)
+    manager.connect()
+    leases = manager.get_games()
+    messageQueue = manager.get_messages()
+    logger.info(f"Connected to coordinator on {address[0]}:{address[1]}")
+
+    def next_game():
+        try:
+            return leases.take()
+        except (EOFError, ConnectionError):
+            # the coordinator has finished and shut down
+            return None
+
+    play_games(
+        next_game,
+        agents,
+        maxTasksPerChild,
+        timeLimit,
+        lambda i: messageQueue.put(("started", i, None)),
+        lambda i, r: messageQueue.put(("result", i, r)),
+        lambda i, message: messageQueue.put(("error", i, message)),
+    )
+
+
+def merge(journalPaths: list[str]):
+    """Merges the journals of several shards or runs into a single results
+    csv and exports the stats over all of them.
+    """
+
+    completed = {}
+    for journalPath in journalPaths:
+        completed.update(read_journal(journalPath))
+
+    stats = TournamentStats()
+    rating = Rating()
+    with open(f"game_results_{time}.csv", "w", newline="") as csvFile:
+        writer = csv.DictWriter(csvFile, fieldnames=fieldnames)
+        writer.writeheader()
+        for result in completed.values():
+            writer.writerow(result)
+            stats.add_result(result)
+            rating.add_result(result)
+    stats.write()
+    export_ratings(rating)
 
-            except TimeoutError as error:
-                logger.warning(f"Timed out between {games[i]}")
-                with open(errorGameListPath, "a") as errFile:
-                    errFile.write(f"{games[i]}, {repr(error)}\n")
 
-            except Exception as error:
-                logger.error(f"Exception occurred between {games[i]}: {repr(error)}")
-                logger.error(traceback.format_exc())
-                with open(errorGameListPath, "a") as errFile:
-                    errFile.write(f"{games[i]}, {repr(error), {traceback.format_exc()}}\n")
+def play_game(i: int, agentPair: tuple[str, str]) -> tuple[int, dict]:
+    """Pool task for game i: announces which worker is playing it, so that
+    the worker can be killed on timeout, then plays the game.
+    """
 
-    export_stats(gameResults)
+    startedGames.put((i, os.getpid()))
+    return i, run_match(agentPair)
 
 
 def run_match(agentPair: tuple[str, str]) -> dict:
@@ -99,13 +596,10 @@ def run_match(agentPair: tuple[str, str]) -> dict:
 
     player1_class = None
     player2_class = None
+    p1Name, p2Name = player_names(agentPair)
 
     try:
-        p1_path, p1_class = player1.split(" ")
-        p1 = importlib.import_module(p1_path)
-        # this should return the group name
-        p1Name = player1.split(".")[1]
-        player1_class = Player(name=p1Name, agent=getattr(p1, p1_class)(Colour.RED),)
+        player1_class = Player(name=p1Name, agent=load_agent_class(player1)(Colour.RED),)
     except ModuleNotFoundError as error:
         logger.error(f"Exception occured importing {player1}, agent file could not be imported: {repr(error)}")
         logger.error(traceback.format_exc())
@@ -114,11 +608,7 @@ def run_match(agentPair: tuple[str, str]) -> dict:
         logger.error(traceback.format_exc())
 
     try:
-        p2_path, p2_class = player2.split(" ")
-        p2 = importlib.import_module(p2_path)
-        # this should return the group name
-        p2Name = player2.split(".")[1]
-        player2_class = Player(name=p2Name,agent=getattr(p2, p2_class)(Colour.BLUE),)
+        player2_class = Player(name=p2Name,agent=load_agent_class(player2)(Colour.BLUE),)
     except ModuleNotFoundError as error:
         logger.error(f"Exception occured importing {player1}, agent file could not be imported: {repr(error)}")
         logger.error(traceback.format_exc())
@@ -132,13 +622,14 @@ def run_match(agentPair: tuple[str, str]) -> dict:
             player1_name=player1,
             player2_name=player2,
             winner="",
-            win_method=EndState.FAILED_LOAD,
+            win_method=EndState.FAILED_LOAD.name,
             player_1_move_time="",
             player_2_move_time="",
             player_1_turn="",
             player_2_turn="",
             total_turns="",
-            total_time=""
+            total_time="",
+            swapped="",
         )
     elif player1_class is None:
         logger.info(f"Agent {player1} failed to load, {player2} wins.")
@@ -146,13 +637,14 @@ def run_match(agentPair: tuple[str, str]) -> dict:
             player1_name=player1,
             player2_name=player2_class.name,
             winner=player2_class.name,
-            win_method=EndState.FAILED_LOAD,
+            win_method=EndState.FAILED_LOAD.name,
             player_1_move_time="",
             player_2_move_time="",
             player_1_turn="",
             player_2_turn="",
             total_turns="",
-            total_time=""
+            total_time="",
+            swapped="",
         )
     elif player2_class is None:
         logger.info(f"Agent {player2} failed to load, {player1} wins.")
@@ -160,21 +652,22 @@ def run_match(agentPair: tuple[str, str]) -> dict:
             player1_name=player1_class.name,
             player2_name=player2,
             winner=player1_class.name,
-            win_method=EndState.FAILED_LOAD,
+            win_method=EndState.FAILED_LOAD.name,
             player_1_move_time="",
             player_2_move_time="",
             player_1_turn="",
             player_2_turn="",
             total_turns="",
-            total_time=""
+            total_time="",
+            swapped="",
         )
     else:
-        # the getattr is to get the class from the module, then instantiate it with the colour
         g = Game(
             player1=player1_class,
             player2=player2_class,
             board_size=11,
             silent=True,
+            isolate_agents=True,
         )
         result = g.run()
         logger.info(f"Game complete normally between {player1} and {player2}")
@@ -182,8 +675,44 @@ def run_match(agentPair: tuple[str, str]) -> dict:
     return result
 
 
-def export_stats(gameResults: list[dict]):
-    playerStats = {}
+class MoveTimeHistogram:
+    """Histogram of move times with buckets of logarithmic width, so that
+    percentiles are within HISTOGRAM_RESOLUTION of the true value while the
+    number of buckets only grows with the log of the range of times.
+    """
+
+    def __init__(self):
+        # bucket index -> count, times of 0 are counted in bucket None
+        self.buckets = {}
+        self.count = 0
+
+    def add(self, moveTime: float):
+        bucket = floor(log(moveTime) / log(1 + HISTOGRAM_RESOLUTION)) if moveTime > 0 else None
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+
+    def percentile(self, q: float) -> float:
+        """Returns the move time below which a fraction q of the times lie."""
+
+        if self.count == 0:
+            return 0
+        rank = q * self.count
+        seen = self.buckets.get(None, 0)
+        if seen >= rank:
+            return 0
+        for bucket in sorted(key for key in self.buckets if key is not None):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                # geometric middle of the bucket
+                return (1 + HISTOGRAM_RESOLUTION) ** (bucket + 0.5)
+        return (1 + HISTOGRAM_RESOLUTION) ** (max(key for key in self.buckets if key is not None) + 0.5)
+
+
+class TournamentStats:
+    """Per player stats of a tournament, updated one result at a time so that
+    the standings can be written at any point of the tournament. The memory
+    used grows with the number of players, not the number of games.
+    """
 
     statEntry = {
         "matches": 0,
@@ -196,22 +725,30 @@ def export_stats(gameResults: list[dict]):
         "time_out_loss": 0,
         "regular_loss": 0,
     }
+    # percentiles of the average move time of a player over its games
+    percentiles = {"p50_move_time": 0.5, "p90_move_time": 0.9, "p99_move_time": 0.99}
+
+    def __init__(self):
+        self.playerStats = {}
+        self.moveTimes = {}
 
-    # populate the player stats dictionary
-    for result in gameResults:
-        for player in [result["player1"], result["player2"]]:
-            if player not in playerStats:
-                playerStats[player] = statEntry.copy()
+    def _player(self, player: str) -> dict:
+        if player not in self.playerStats:
+            self.playerStats[player] = self.statEntry.copy()
+            self.moveTimes[player] = MoveTimeHistogram()
+        return self.playerStats[player]
 
-    # fill in the data
-    for result in gameResults:
+    def add_result(self, result: dict):
         player1 = result["player1"]
         player2 = result["player2"]
         winner = result["winner"]
+        self._player(player1)
+        self._player(player2)
+        playerStats = self.playerStats
 
-        if result["win_method"] == EndState.FAILED_LOAD:
+        if result["win_method"] == EndState.FAILED_LOAD.name:
             if winner == "":
-                continue
+                return
             else:
                 playerStats[winner]["matches"] += 1
                 playerStats[winner]["wins"] += 1
@@ -227,23 +764,58 @@ def export_stats(gameResults: list[dict]):
             playerStats[player2]["total_move_time"] += result["player2_move_time"]
             playerStats[player1]["total_moves"] += result["player1_turns"]
             playerStats[player2]["total_moves"] += result["player2_turns"]
+            for player, moveTime, turns in [
+                (player1, result["player1_move_time"], result["player1_turns"]),
+                (player2, result["player2_move_time"], result["player2_turns"]),
+            ]:
+                if turns > 0:
+                    self.moveTimes[player].add(moveTime / turns)
 
             playerStats[winner]["wins"] += 1
             playerStats[loser]["illegal_moves_loss"] += 1 if result["win_method"] == "BAD_MOVE" else 0
             playerStats[loser]["time_out_loss"] += 1 if result["win_method"] == "TIMEOUT" else 0
             playerStats[loser]["regular_loss"] += 1 if result["win_method"] == "WIN" else 0
 
-    for player, stats in playerStats.items():
-        playerStats[player]["win_rate"] = stats["wins"] / stats["matches"] if stats["matches"] > 0 else 0
-        playerStats[player]["average_move_time"] = (
-            stats["total_move_time"] / stats["total_moves"] if stats["total_moves"] > 0 else 0
-        )
+        for player in {player1, player2}:
+            stats = playerStats[player]
+            stats["win_rate"] = stats["wins"] / stats["matches"] if stats["matches"] > 0 else 0
+            stats["average_move_time"] = (
+                stats["total_move_time"] / stats["total_moves"] if stats["total_moves"] > 0 else 0
+            )
+
+    def write(self):
+        """Writes the current standings to the stats csv, replacing it
+        atomically so that it can be read while the tournament runs.
+        """
+
+        statPath = f"game_stat_{time}.csv"
+        with open(statPath + ".tmp", "w", newline="") as csvFile:
+            writer = csv.writer(csvFile)
+            writer.writerow(["player"] + list(self.statEntry.keys()) + list(self.percentiles.keys()))
+            for player, stats in self.playerStats.items():
+                moveTimes = self.moveTimes[player]
+                writer.writerow(
+                    [player]
+                    + list(stats.values())
+                    + [round(moveTimes.percentile(q), 6) for q in self.percentiles.values()]
+                )
+        os.replace(statPath + ".tmp", statPath)
+
+
+def export_ratings(rating: Rating):
+    """Writes the Elo rating of every player, and of the colour and swap
+    effects, with their 95% confidence intervals.
+    """
 
-    with open(f"game_stat_{time}.csv", "w", newline="") as csvFile:
+    with open(f"game_rating_{time}.csv", "w", newline="") as csvFile:
         writer = csv.writer(csvFile)
-        writer.writerow(["player"] + list(statEntry.keys()))
-        for player, stats in playerStats.items():
-            writer.writerow([player] + list(stats.values()))
+        writer.writerow(["player", "elo", "elo_95_interval"])
+        if not rating.players:
+            return
+        for player, (elo, width) in sorted(rating.ratings().items(), key=lambda item: -item[1][0]):
+            writer.writerow([player, round(elo, 1), round(width, 1)])
+        writer.writerow(["red_advantage"] + [round(value, 1) for value in rating.red_advantage()])
+        writer.writerow(["swap_advantage"] + [round(value, 1) for value in rating.swap_advantage()])
 
 
 if __name__ == "__main__":
@@ -257,8 +829,111 @@ if __name__ == "__main__":
         type=str,
         help="Path to a newline separated list of int, which are the group number. Each line will play against every other group",
     )
+    parser.add_argument(
+        "-t",
+        "--timeLimit",
+        type=float,
+        default=TIME_OUT_LIMIT,
+        help="Wall-clock limit of a single game in seconds, after which the game is killed and logged as an error",
+    )
+    parser.add_argument(
+        "-j",
+        "--journal",
+        type=str,
+        default=None,
+        help="Path of a tournament journal. Completed games are appended to it, and games already in it are skipped, so rerunning with the same journal resumes an interrupted tournament",
+    )
+    parser.add_argument(
+        "-r",
+        "--repetitions",
+        type=int,
+        default=1,
+        help="Number of times each pairing is played",
+    )
+    parser.add_argument(
+        "-m",
+        "--maxTasksPerChild",
+        type=int,
+        default=None,
+        help="Number of games a worker process plays before being replaced, for isolation between agents. By default workers are kept for the whole tournament",
+    )
+    parser.add_argument(
+        "-s",
+        "--shard",
+        type=parse_shard,
+        default=(0, 1),
+        help="Only play the games whose index is i modulo N, given as i/N, so that N machines can each run one shard. Merge their journals with --merge afterwards",
+    )
+    parser.add_argument(
+        "-c",
+        "--converge",
+        type=float,
+        default=None,
+        metavar="ELO",
+        help="Stop starting new games once the 95%% confidence interval of every rating is within ELO points either side",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--serve",
+        type=str,
+        metavar="HOST:PORT",
+        help="Coordinate the tournament for worker nodes started with --connect instead of playing it locally",
+    )
+    mode.add_argument(
+        "--connect",
+        type=str,
+        metavar="HOST:PORT",
+        help="Play games handed out by the coordinator at the given address",
+    )
+    mode.add_argument(
+        "--versus",
+        type=str,
+        nargs=2,
+        metavar="AGENT",
+        help='Play two agents, given as agent strings such as "agents.Group17.GoodAgent GoodAgent EXPLORATION_CONSTANT=1", against each other until a sequential probability ratio test decides whether the first is stronger',
+    )
+    mode.add_argument(
+        "--merge",
+        type=str,
+        nargs="+",
+        metavar="JOURNAL",
+        help="Merge the journals of several shards into a single results csv and stats",
+    )
+    parser.add_argument(
+        "--sprt",
+        type=float,
+        nargs=4,
+        default=[0, 10, 0.05, 0.05],
+        metavar=("ELO0", "ELO1", "ALPHA", "BETA"),
+        help="Hypotheses and error rates of the --versus test: the first agent is ELO0 against ELO1 Elo points stronger",
+    )
+    parser.add_argument(
+        "--maxGames",
+        type=int,
+        default=10_000,
+        help="Number of games after which --versus gives up on deciding the test",
+    )
+    parser.add_argument(
+        "-k",
+        "--authKey",
+        type=str,
+        default=None,
+        help="Shared key that worker nodes use to authenticate with the coordinator. Required by --connect; --serve generates and prints one when it is not given",
+    )
 
     args = parser.parse_args()
+    # the coordinator unpickles what its nodes send, so it never runs with a known key
+    if args.connect and args.authKey is None:
+        parser.error("--connect requires the --authKey of the coordinator")
+
+    if args.merge:
+        merge(args.merge)
+        raise SystemExit
+
+    if args.versus:
+        agentA, agentB = args.versus
+        head_to_head(agentA, agentB, SPRT(*args.sprt), args.maxGames, args.maxTasksPerChild, args.timeLimit, args.journal)
+        raise SystemExit
 
     def extract_group_number(path):
         if match := re.search(r"Group(\d+)", path):
@@ -288,7 +963,20 @@ if __name__ == "__main__":
                 # the given line as player B
                 games.extend(zip(agents.values(), repeat(agents[int(line)]), strict=False))
 
-        # remove all repeat and self play
-        games = [(i, j) for i, j in list(set(games)) if i != j]
-
-    run(games)
+        # remove all repeat and self play, in a fixed order so that every shard sees the same list
+        games = sorted((i, j) for i, j in set(games) if i != j)
+
+    games = games * args.repetitions
+
+    if args.serve:
+        host, port = args.serve.rsplit(":", 1)
+        authKey = args.authKey
+        if authKey is None:
+            authKey = secrets.token_hex(16)
+            logger.info(f"Start worker nodes with --connect {args.serve} --authKey {authKey}")
+        serve(games, (host, int(port)), authKey.encode(), args.timeLimit, args.journal)
+    elif args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        work((host, int(port)), args.authKey.encode(), list(agents.values()), args.maxTasksPerChild, args.timeLimit)
+    else:
+        run(games, args.maxTasksPerChild, args.timeLimit, args.journal, args.shard, args.converge)
@@ -1,8 +1,7 @@
-from subprocess import PIPE, Popen
-
 from src.AgentBase import AgentBase
 from src.Board import Board
 from src.Colour import Colour
+from src.EngineProtocol import EngineConnection
 from src.Move import Move
 
 
@@ -16,16 +15,21 @@ class ExternalAgent(AgentBase):
     You CANNOT modify the AgentBase class, otherwise your agent might not function.
     """
 
+    # version of the engine protocol the process speaks, see EngineConnection
+    PROTOCOL_VERSION = 1
+    # whether to use binary frames, from protocol version 2
+    BINARY_PROTOCOL = False
+
     def __init__(self, colour: Colour):
         super().__init__(colour)
         # spawn a process that calls a compiled java NaiveAgent.class file and passes two arguments:
         # - "R" or "B" to tell the agent which colour it is
         # - 11, which is the size of the board
-        self.agent_process = Popen(
+        self.engine = EngineConnection(
             ["java", "-cp", "agents/DefaultAgents", "NaiveAgent", colour.get_char(), "11"],
-            stdout=PIPE,
-            stdin=PIPE,
-            text=True,
+            colour,
+            version=self.PROTOCOL_VERSION,
+            binary=self.BINARY_PROTOCOL,
         )
 
     def make_move(self, turn: int, board: Board, opp_move: Move | None) -> Move:
@@ -43,35 +47,4 @@ class ExternalAgent(AgentBase):
         Returns:
             Move: The agent's move
         """
-        # translate the python objects into string representations
-        rows = board.tiles()
-        board_strings = []
-        for row in rows:
-            row_string = ""
-            for tile in row:
-                colour = tile.colour
-                if colour is None:
-                    t = "0"
-                else:
-                    t = colour.get_char()
-                row_string += t
-            board_strings.append(row_string)
-        board_string = ",".join(board_strings)
-
-        if opp_move is None:
-            # should be turn 1
-            command = f"START;;{board_string};{turn};"
-        elif opp_move.is_swap():
-            command = f"SWAP;;{board_string};{turn};"
-        else:
-            command = f"CHANGE;{opp_move.x},{opp_move.y};{board_string};{turn};"
-
-        # send the command to the agent process and get response
-        self.agent_process.stdin.write(command + "\n")
-        self.agent_process.stdin.flush()
-
-        response = self.agent_process.stdout.readline().rstrip()
-
-        # assuming the response takes the form "x,y" with -1,-1 if the agent wants to make a swap move
-        x, y = response.split(",")
-        return Move(int(x), int(y))
+        return self.engine.request_move(turn, board, opp_move, self.colour)
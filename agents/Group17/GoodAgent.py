@@ -1,6 +1,9 @@
-from random import choice, shuffle
+from multiprocessing import Pipe
+from random import choice, getrandbits, seed, shuffle
 from time import time
 import math
+import os
+import signal
 
 from agents.Group17.chain import ChainFinder
 # from agents.Group17.template import ChainFinder
@@ -9,155 +12,393 @@ from src.Board import Board
 from src.Colour import Colour
 from src.Move import Move
 from agents.Group17.bridgeDefender import BridgeDefender
+from agents.Group17.NodeStore import NodeStore
+from agents.Group17.Rollout import Rollout
 
-class Node:
-    children = None # set in expansion
-    parent: None # never changes
-
-    state: list[list[Colour | None]] # never changes
-    prev_action: None | tuple[int, int] # never changes
-    available_actions: list[tuple[int, int]] # never changes
-
-    visits: int = 0 # increases in backpropagation
-    value: int = 0 # increases in backpropagation
-    our_turn: bool # in this state, is it our turn to move?
-
-    def __init__(self, state: list[list[Colour | None]], available_actions: list[tuple[int, int]], our_turn: bool, parent = None, prev_action = None):
-        self.parent = parent
-        self.state = state
-        self.available_actions = available_actions
-        self.our_turn = our_turn
-        self.prev_action = prev_action
-        self.children = []
-
-    def UCT(self, risk, parent_visits):
-        """Upper Confidence Bound for Trees"""
-        if self.visits == 0:
-            return math.inf
-        return self.value / self.visits + risk * math.sqrt(math.log(parent_visits) / self.visits)
-
+try:
+    from agents.Group17.BatchPlayout import BatchPlayout
+except ImportError:
+    # without numpy the simulations are played one at a time
+    BatchPlayout = None
 
 class GoodAgent(AgentBase):
     _choices: list[tuple[int, int]]
     _board_size: int = 11
     _time_limit: int = 5 # seconds per move
     _max_iterations: int = 20_000
+    _node_capacity: int = 1 << 22 # most nodes in the search tree, 44 bytes each and allocated as the tree grows
+    _transpositions: int = 1 << 20 # most positions whose statistics are shared between nodes, about 110 bytes each
+    _search_workers: int = 1 # processes searching each move, merged at the root
+    _worker_grace: float = 1 # seconds to wait for a worker after the time limit
+    _playouts_per_leaf: int = 1 # above 1, simulations are played in batches with numpy when it is installed
     EXPLORATION_CONSTANT = 2
+    # how quickly a node's own value takes over from its RAVE value, smaller trusts RAVE for longer
+    RAVE_BIAS = 1e-3
+    # share of the RAVE statistics of our moves carried over from one of our turns to the next
+    RAVE_CARRY = 0.2
     _parent_node_visits: int
     is_winning_chain = False
     virtual_connections = None
 
+    # search tree kept between turns, _root is -1 when there is none
+    _tree: NodeStore
+    _root: int = -1
+    _root_state: list[list[Colour | None]]
+    _root_our_turn: bool # in the root state, is it our turn to move?
+    _root_empty: int # empty tiles in the root state
+    _zobrist: dict[Colour, list[int]] # random key of each tile for each colour
+    # RAVE visits and value of our moves at the root of our last turn, by move, for the children of the next root
+    _rave_prior: dict[int, tuple[int, int]]
+
     def __init__(self, colour: Colour):
         super().__init__(colour)
         self._choices = [
             (i, j) for i in range(self._board_size) for j in range(self._board_size)
         ]
-
-    def selection(self, node: Node):
-        """select the child node with the highest UCT value"""
-        while node.children:
-            node = max(node.children, key=lambda child: child.UCT(self.EXPLORATION_CONSTANT, self._parent_node_visits))
-        return node
-
-    def expansion(self, node: Node):
-        """expand the node by adding all possible actions as children"""
-        for action in node.available_actions:
-            new_state = self.copy_state(node.state)
-            colour = self.colour if node.our_turn else self.opp_colour()
-            x,y = action
-            new_state[x][y] = colour
-            new_available_actions = [a for a in node.available_actions if a != action]
-            node.children.append(Node(
-                state=new_state,
-                available_actions=new_available_actions,
-                our_turn=not node.our_turn,
-                parent=node,
-                prev_action=action,
-            ))
-
-    def simulation(self, node: Node):
-        """play until no available actions remain
-        then return whether we won"""
-        available_actions = node.available_actions.copy()
-        state = self.copy_state(node.state)
-        our_turn = not node.our_turn
-        shuffle(available_actions)
-        while available_actions:
-            x, y = available_actions.pop()
+        self._tree = NodeStore(self._node_capacity, self._transpositions)
+        self._rave_prior = {}
+        self._rollout = Rollout(self._board_size)
+        self._batch = (
+            BatchPlayout(self._board_size) if BatchPlayout is not None and self._playouts_per_leaf > 1 else None
+        )
+        self._zobrist = {
+            colour: [getrandbits(63) for _ in range(self._board_size * self._board_size)]
+            for colour in (Colour.RED, Colour.BLUE)
+        }
+
+    def selection(self, root: int):
+        """select the child node with the highest UCT value until reaching a
+        node with untried moves, replaying the moves on the way to get its state
+        the value of a child is blended with its RAVE value, which counts for less as its visits grow
+        returns the path from the root, the node's state and whether it is our turn in it"""
+        tree = self._tree
+        state = self.copy_state(self._root_state)
+        our_turn = self._root_our_turn
+        empty = self._root_empty
+        log_visits = math.log(self._parent_node_visits) if self._parent_node_visits else 0
+        path = [root]
+        node = root
+        # a node has one child per empty tile once fully expanded
+        while empty and tree.child_count[node] == empty:
+            best_uct = -math.inf
+            child = tree.first_child[node]
+            while child >= 0:
+                # transposed positions share the statistics of one node
+                shared = tree.share[child]
+                visits = tree.visits[shared]
+                if visits:
+                    value = tree.value[shared] / visits
+                    amaf_visits = tree.amaf_visits[child]
+                    if amaf_visits:
+                        beta = amaf_visits / (visits + amaf_visits + self.RAVE_BIAS * visits * amaf_visits)
+                        value += beta * (tree.amaf_value[child] / amaf_visits - value)
+                    uct = value + self.EXPLORATION_CONSTANT * math.sqrt(log_visits / visits)
+                else:
+                    uct = math.inf
+                if uct > best_uct:
+                    best_uct = uct
+                    node = child
+                child = tree.next_sibling[child]
+            x, y = divmod(tree.move[node], self._board_size)
             state[x][y] = self.colour if our_turn else self.opp_colour()
             our_turn = not our_turn
-
-        return ChainFinder(state, self.colour).search(False)[0]
-
-    def backpropagation(self, node: Node, win: bool):
-        """update all parent nodes with the result of the simulation
+            empty -= 1
+            path.append(node)
+        return path, state, our_turn
+
+    def expansion(self, node: int, state: list[list[Colour | None]], our_turn: bool) -> int:
+        """expand the node by adding a child for one random untried move
+        the untried moves are listed in random order the first time the node is expanded
+        returns the child, or -1 if there are no untried moves or the tree is full"""
+        tree = self._tree
+        moves = tree.untried.get(node)
+        if moves is None:
+            tried = {tree.move[child] for child in tree.children(node)}
+            moves = [
+                x * self._board_size + y
+                for x in range(self._board_size) for y in range(self._board_size)
+                if state[x][y] is None and x * self._board_size + y not in tried
+            ]
+            shuffle(moves)
+            tree.untried[node] = moves
+        if not moves:
+            return -1
+        move = moves[-1]
+        child = tree.add_child(node, move, self.child_key(node, move, our_turn))
+        if child >= 0:
+            moves.pop()
+            if node == self._root and our_turn and move in self._rave_prior:
+                tree.amaf_visits[child], tree.amaf_value[child] = self._rave_prior[move]
+        return child
+
+    def child_key(self, node: int, move: int, our_turn: bool) -> int:
+        """zobrist key of the state reached by playing move in the node's state"""
+        return self._tree.key[node] ^ self._zobrist[self.colour if our_turn else self.opp_colour()][move]
+
+    def simulation(self, state: list[list[Colour | None]], our_turn: bool):
+        """play until no available actions remain, filling in state
+        then return whether we won"""
+        rollout = self._rollout
+        red_won = rollout.play(state, self.colour if our_turn else self.opp_colour())
+        for x, row in enumerate(state):
+            row[:] = rollout.cells[x * self._board_size:(x + 1) * self._board_size]
+        return red_won == (self.colour == Colour.RED)
+
+    def backpropagation(self, path: list[int], our_turn: bool, win: bool, state: list[list[Colour | None]] | None = None):
+        """update all nodes on the path with the result of the simulation
         if we won, increment the value of all nodes on our turn
-        if we lost, increment the value of all nodes on the opponentMove's turn"""
-        while node:
-            node.visits += 1
-            if win and not node.our_turn:
-                node.value += 1
-            elif not win and node.our_turn:
-                node.value += 1
-            node = node.parent
+        if we lost, increment the value of all nodes on the opponentMove's turn
+        given the filled state the simulation ended in, also update the RAVE statistics"""
+        tree = self._tree
+        for node in reversed(path):
+            if state is not None:
+                self.update_amaf(node, our_turn, win, state)
+            node = tree.share[node]
+            tree.visits[node] += 1
+            if win != our_turn:
+                tree.value[node] += 1
+            our_turn = not our_turn
         self._parent_node_visits += 1
 
+    def batch_simulation(self, state: list[list[Colour | None]], our_turn: bool):
+        """play _playouts_per_leaf simulations at once
+        returns how many we won and, for each colour, in how many it took each tile and in how many of those it won"""
+        red_wins, boards = self._batch.play(state, self.colour if our_turn else self.opp_colour(), self._playouts_per_leaf)
+        boards = boards.reshape(len(boards), -1)
+        amaf = {}
+        for colour, won in ((Colour.RED, red_wins), (Colour.BLUE, ~red_wins)):
+            taken = boards == (1 if colour == Colour.RED else 2)
+            amaf[colour] = (taken.sum(axis=0).tolist(), taken[won].sum(axis=0).tolist())
+        wins = red_wins.sum() if self.colour == Colour.RED else len(red_wins) - red_wins.sum()
+        return int(wins), amaf
+
+    def batch_backpropagation(self, path: list[int], our_turn: bool, playouts: int, wins: int, amaf):
+        """backpropagation of a batch of simulations, of which we won wins
+        amaf is what batch_simulation returns for the RAVE statistics"""
+        tree = self._tree
+        for node in reversed(path):
+            taken, taken_won = amaf[self.colour if our_turn else self.opp_colour()]
+            child = tree.first_child[node]
+            while child >= 0:
+                move = tree.move[child]
+                tree.amaf_visits[child] += taken[move]
+                tree.amaf_value[child] += taken_won[move]
+                child = tree.next_sibling[child]
+            node = tree.share[node]
+            tree.visits[node] += playouts
+            tree.value[node] += playouts - wins if our_turn else wins
+            our_turn = not our_turn
+        self._parent_node_visits += playouts
+
+    def update_amaf(self, node: int, our_turn: bool, win: bool, state: list[list[Colour | None]]):
+        """all moves as first: update the RAVE statistics of every child whose move
+        was played later in the simulation by the player to move in the node"""
+        tree = self._tree
+        colour = self.colour if our_turn else self.opp_colour()
+        won = win == our_turn
+        child = tree.first_child[node]
+        while child >= 0:
+            x, y = divmod(tree.move[child], self._board_size)
+            if state[x][y] == colour:
+                tree.amaf_visits[child] += 1
+                if won:
+                    tree.amaf_value[child] += 1
+            child = tree.next_sibling[child]
+
+    def search_step(self, root: int) -> tuple[float, float, float, float]:
+        """one iteration of selection, expansion, simulation and backpropagation,
+        returns the seconds spent in each phase"""
+        # Selection
+        selection_start_time = time()
+        path, state, our_turn = self.selection(root)
+        # Expansion
+        expansion_start_time = time()
+        leaf = self.expansion(path[-1], state, our_turn)
+        if leaf >= 0:
+            x, y = divmod(self._tree.move[leaf], self._board_size)
+            state[x][y] = self.colour if our_turn else self.opp_colour()
+            our_turn = not our_turn
+            path.append(leaf)
+        # Simulation
+        simulation_start_time = time()
+        if self._batch is not None:
+            wins, amaf = self.batch_simulation(state, our_turn)
+        else:
+            win = self.simulation(state, our_turn)
+        # Backpropagation
+        backpropagation_start_time = time()
+        if self._batch is not None:
+            self.batch_backpropagation(path, our_turn, self._playouts_per_leaf, wins, amaf)
+        else:
+            self.backpropagation(path, our_turn, win, state)
+        end_time = time()
+        return (
+            expansion_start_time - selection_start_time,
+            simulation_start_time - expansion_start_time,
+            backpropagation_start_time - simulation_start_time,
+            end_time - backpropagation_start_time,
+        )
+
+    def set_root(self, state: list[list[Colour | None]], our_turn: bool) -> int:
+        """keep the tree if its root is at this state, otherwise start a new one"""
+        if self._root < 0 or self._root_state != state or self._root_our_turn != our_turn:
+            self._root = self._tree.new_root(self.state_key(state))
+            self._root_state = self.copy_state(state)
+            self._root_our_turn = our_turn
+            self._root_empty = sum(row.count(None) for row in state)
+        elif self._tree.size > self._tree.capacity // 2:
+            # free the nodes left behind by earlier turns
+            self._root = self._tree.keep_subtree(self._root)
+        self._parent_node_visits = self._tree.visits[self._tree.share[self._root]]
+        return self._root
+
+    def advance_tree(self, action: tuple[int, int] | None):
+        """move the root of the kept tree to the child reached by action,
+        or drop the tree if there is no such child"""
+        root = self._root
+        self._root = -1
+        if root < 0 or action is None:
+            return
+        if self._root_our_turn:
+            # few of our iterations reach the position after the opponent's reply, but
+            # our moves' RAVE statistics still say how good they are two moves later
+            tree = self._tree
+            self._rave_prior = {
+                tree.move[child]: (int(tree.amaf_visits[child] * self.RAVE_CARRY),
+                                   int(tree.amaf_value[child] * self.RAVE_CARRY))
+                for child in tree.children(root)
+            }
+        x, y = action
+        child = self._tree.find_child(root, x * self._board_size + y)
+        if child >= 0:
+            self._root_state = self.copy_state(self._root_state)
+            self._root_state[x][y] = self.colour if self._root_our_turn else self.opp_colour()
+            self._root_our_turn = not self._root_our_turn
+            self._root_empty -= 1
+            self._root = child
+
+    def ponder(self, board: Board, stop_event):
+        """Inherited from AgentBase
+        keep growing the tree while the opponent thinks"""
+        state = [[tile.colour for tile in row] for row in board.tiles]
+        root = self.set_root(state, False)
+        iterations = 0
+        while not stop_event.is_set() and iterations < self._max_iterations and board.empty():
+            iterations += 1
+            self.search_step(root)
+
+    def state_key(self, state: list[list[Colour | None]]) -> int:
+        """zobrist key of a state, children's keys are updated from it move by move"""
+        key = 0
+        for x, row in enumerate(state):
+            for y, colour in enumerate(row):
+                if colour is not None:
+                    key ^= self._zobrist[colour][x * self._board_size + y]
+        return key
+
+    def root_statistics(self, root: int) -> dict[int, tuple[int, int]]:
+        """visits and value of each child of the root, by move"""
+        tree = self._tree
+        return {
+            tree.move[child]: (tree.visits[tree.share[child]], tree.value[tree.share[child]])
+            for child in tree.children(root)
+        }
+
+    def fork_workers(self, root: int, start_time: float) -> list:
+        """start _search_workers - 1 processes that each grow their own copy of the tree
+        until the time limit, then send back their root statistics
+        forking also works inside the daemonic workers of a tournament pool
+        returns the pid and connection of each worker"""
+        workers = []
+        for _ in range(self._search_workers - 1):
+            connection, worker_connection = Pipe()
+            pid = os.fork()
+            if pid == 0:
+                connection.close()
+                try:
+                    # otherwise every worker would play the same simulations
+                    seed()
+                    if self._batch is not None:
+                        self._batch.reseed()
+                    iterations = 0
+                    while iterations < self._max_iterations and (not iterations or time() - start_time < self._time_limit):
+                        iterations += 1
+                        self.search_step(root)
+                    worker_connection.send(self.root_statistics(root))
+                finally:
+                    os._exit(0)
+            worker_connection.close()
+            workers.append((pid, connection))
+        return workers
+
+    def collect_workers(self, workers: list, start_time: float, baseline: dict[int, tuple[int, int]],
+                        statistics: dict[int, tuple[int, int]]):
+        """add what each worker learned since it was forked, the difference between
+        its root statistics and the baseline, to statistics
+        workers that do not reply in time are killed and ignored"""
+        for pid, connection in workers:
+            timeout = max(0, start_time + self._time_limit - time()) + self._worker_grace
+            try:
+                worker_statistics = connection.recv() if connection.poll(timeout) else {}
+            except EOFError:
+                worker_statistics = {}
+            for move, (visits, value) in worker_statistics.items():
+                base_visits, base_value = baseline.get(move, (0, 0))
+                total_visits, total_value = statistics.get(move, (0, 0))
+                statistics[move] = (total_visits + visits - base_visits, total_value + value - base_value)
+            connection.close()
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
     def copy_state(self, state):
         """rows are mutable, so we need a deep copy"""
         return [list(row) for row in state]
 
-    def mcts(self, state, available_actions, start_time):
+    def mcts(self, state, start_time):
         """Main function for Monte Carlo Tree Search"""
-        root = Node(
-            state=state,
-            available_actions=available_actions,
-            our_turn=True
-        )
-        self._parent_node_visits = 0
-        self.expansion(root)
+        # continue from the tree of the previous turns if it reached this state
+        tree = self._tree
+        root = self.set_root(state, True)
+        print(f"Reused visits: {tree.visits[tree.share[root]]}")
+        print(f"Carried RAVE visits: {sum(visits for visits, _ in self._rave_prior.values())}")
         print(f"Total setup time: {time() - start_time:.5f}s")
+        # root parallelism: the workers search from the same tree, only their root statistics are merged
+        workers = []
+        if self._search_workers > 1:
+            baseline = self.root_statistics(root)
+            workers = self.fork_workers(root, start_time)
 
         iterations = 0
-        selection_times = []
-        expansion_times = []
-        simulation_times = []
-        backpropagation_times = []
-        while iterations < self._max_iterations and time() - start_time < self._time_limit:
+        # seconds spent in selection, expansion, simulation and backpropagation
+        phase_times = [0.0, 0.0, 0.0, 0.0]
+        # at least one iteration, so that the root has a child to choose
+        while iterations < self._max_iterations and (not iterations or time() - start_time < self._time_limit):
             iterations += 1
-            # Selection
-            selection_start_time = time()
-            leaf = self.selection(root)
-            selection_times.append(time() - selection_start_time)
-            # Expansion
-            expansion_start_time = time()
-            if leaf.visits > 0 and leaf.available_actions:
-                self.expansion(leaf)
-                leaf = choice(leaf.children)
-            expansion_times.append(time() - expansion_start_time)
-            # Simulation
-            simulation_start_time = time()
-            win = self.simulation(leaf)
-            simulation_times.append(time() - simulation_start_time)
-            # Backpropagation
-            backpropagation_start_time = time()
-            self.backpropagation(leaf, win)
-            backpropagation_times.append(time() - backpropagation_start_time)
+            for phase, seconds in enumerate(self.search_step(root)):
+                phase_times[phase] += seconds
 
+        statistics = self.root_statistics(root)
+        if workers:
+            self.collect_workers(workers, start_time, baseline, statistics)
         available_moves_str = '\t'.join(
-            [f'({child.prev_action[0]},{child.prev_action[1]}): {child.value}/{child.visits}' for child in root.children]
+            [f'({move // self._board_size},{move % self._board_size}): {value}/{visits}'
+             for move, (visits, value) in statistics.items()]
         )
         print(f"""Average times after {iterations} iterations:
-                Selection: {(sum(selection_times) / iterations):.5f}s
-                Expansion: {(sum(expansion_times) / iterations):.5f}s
-                Simulation: {(sum(simulation_times) / iterations):.5f}s
-                Backpropagation: {(sum(backpropagation_times) / iterations):.5f}s
+                Selection: {(phase_times[0] / iterations):.5f}s
+                Expansion: {(phase_times[1] / iterations):.5f}s
+                Simulation: {(phase_times[2] / iterations):.5f}s
+                Backpropagation: {(phase_times[3] / iterations):.5f}s
 
                 Available Moves:
                 {available_moves_str}
         """)
 
-        node = max(root.children, key=lambda child: child.UCT(0, self._parent_node_visits))
-        return node.prev_action
+        move = max(statistics, key=lambda move: statistics[move][1] / statistics[move][0])
+        return divmod(move, self._board_size)
 
     def end_turn(self, move: tuple[int, int]) -> Move:
         """remove from choices and return tuple converted into move"""
@@ -168,6 +409,10 @@ class GoodAgent(AgentBase):
 
         print("MAKING MOVE: ", move)
         self._choices.remove(move)
+        if self._root < 0:
+            # without a tree for this turn, the RAVE statistics are from an older position
+            self._rave_prior = {}
+        self.advance_tree(move)
         x, y = move
         return Move(x,y)
 
@@ -232,10 +477,17 @@ class GoodAgent(AgentBase):
 
         if opp_move and opp_move != Move(-1, -1):
             self._choices.remove((opp_move.x, opp_move.y))
+            self.advance_tree((opp_move.x, opp_move.y))
+        else:
+            # a swap changes our colour, which the kept tree's states depend on
+            self._root = -1
+            self._rave_prior = {}
 
         # Only swap if first move is within 2 cells from center
         print(f"\033[32mOpponent move: {opp_move}\033[0m")
         if turn == 2 and 3 <= opp_move.x <= 7 and 3 <= opp_move.y <= 7:
+            self._root = -1
+            self._rave_prior = {}
             return Move(-1, -1)
 
         state = [[tile.colour for tile in row] for row in board.tiles]
@@ -275,5 +527,5 @@ class GoodAgent(AgentBase):
             return self.end_turn(move)
         print(f"Template check time: {time() - template_check_start_time:.5f}s")
         
-        move = self.mcts(state, self._choices, start_time)
+        move = self.mcts(state, start_time)
         return self.end_turn(move)
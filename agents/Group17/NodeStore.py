@@ -0,0 +1,183 @@
+from array import array
+from collections import OrderedDict
+
+
+class NodeStore:
+    """MCTS tree stored as flat arrays with one entry per node.
+
+    Nodes are indices into arrays of 44 bytes per node, which start small
+    and double in length when they fill up, until they hold capacity nodes.
+    Children are added one at a time, as they are tried, and linked through
+    next_sibling. A node that has been expanded keeps the moves it has not
+    tried yet in untried, in the random order they will be tried in. Nodes do not store board states: the state of a node is
+    the root state with the moves on the path to it replayed, and the side
+    to move follows from the depth. Besides its visits and value, a node has the all-moves-as-first
+    (RAVE) visits and value of its move: the playouts through its parent in
+    which the player to move there played the move at any later point.
+
+    Nodes at the same position, reached by different move orders, share
+    their statistics: the transposition table maps the key of a position to
+    the node holding its visits and value, and share points every node to
+    that node. The table holds at most max_transpositions keys, evicting the
+    oldest; nodes already sharing an evicted entry keep sharing it.
+    """
+
+    # nodes the arrays have room for at first
+    INITIAL_LENGTH = 1 << 12
+
+    def __init__(self, capacity: int, max_transpositions: int | None = None):
+        self.capacity = capacity
+        self.max_transpositions = max_transpositions or capacity
+        self.size = 0
+        # position key -> node holding the statistics of the position, oldest first
+        self.table = OrderedDict()
+        # node -> its untried moves, popped from the end
+        self.untried = {}
+        length = min(capacity, self.INITIAL_LENGTH)
+        self.parent = array("i", [-1]) * length
+        # the move leading to the node, as x * board_size + y
+        self.move = array("h", [-1]) * length
+        self.first_child = array("i", [-1]) * length
+        self.next_sibling = array("i", [-1]) * length
+        self.child_count = array("h", [0]) * length
+        self.visits = array("i", [0]) * length
+        self.value = array("i", [0]) * length
+        self.amaf_visits = array("i", [0]) * length
+        self.amaf_value = array("i", [0]) * length
+        self.key = array("q", [0]) * length
+        # the node whose visits and value are used for this one
+        self.share = array("i", [-1]) * length
+
+    @property
+    def length(self) -> int:
+        """The number of nodes the arrays have room for."""
+
+        return len(self.parent)
+
+    def new_root(self, key: int | None = None) -> int:
+        """Empties the store and returns the index of a new root."""
+
+        self.size = 0
+        self.table.clear()
+        self.untried.clear()
+        return self._allocate(-1, -1, key)
+
+    def add_child(self, node: int, move: int, key: int | None = None) -> int:
+        """Adds a child reached by move, returns -1 if the store is full.
+        Nodes given the same key share their statistics, nodes without a
+        key have their own.
+        """
+
+        if self.size == self.capacity:
+            return -1
+        child = self._allocate(node, move, key)
+        self.next_sibling[child] = self.first_child[node]
+        self.first_child[node] = child
+        self.child_count[node] += 1
+        return child
+
+    def children(self, node: int) -> list[int]:
+        children = []
+        child = self.first_child[node]
+        while child >= 0:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def find_child(self, node: int, move: int) -> int:
+        """Returns the child reached by move, or -1 if there is none."""
+
+        child = self.first_child[node]
+        while child >= 0 and self.move[child] != move:
+            child = self.next_sibling[child]
+        return child
+
+    def keep_subtree(self, node: int) -> int:
+        """Drops every node outside the subtree of node, which becomes the
+        root, and returns its new index.
+        """
+
+        order = [node]
+        newIndex = {node: 0, -1: -1}
+        for old in order:
+            for child in self.children(old):
+                newIndex[child] = len(order)
+                order.append(child)
+
+        # a node sharing the statistics of a dropped node takes them over,
+        # and the other nodes sharing them now share its
+        share = []
+        statistics = []
+        promoted = {}
+        for old in order:
+            shared = self.share[old]
+            if shared in newIndex:
+                share.append(newIndex[shared])
+                statistics.append(old)
+            else:
+                if shared not in promoted:
+                    promoted[shared] = newIndex[old]
+                share.append(promoted[shared])
+                statistics.append(shared)
+
+        for field, values in [
+            (self.parent, [-1] + [newIndex[self.parent[old]] for old in order[1:]]),
+            (self.move, [self.move[old] for old in order]),
+            (self.first_child, [newIndex[self.first_child[old]] for old in order]),
+            (self.next_sibling, [-1] + [newIndex[self.next_sibling[old]] for old in order[1:]]),
+            (self.child_count, [self.child_count[old] for old in order]),
+            (self.visits, [self.visits[old] for old in statistics]),
+            (self.value, [self.value[old] for old in statistics]),
+            (self.amaf_visits, [self.amaf_visits[old] for old in order]),
+            (self.amaf_value, [self.amaf_value[old] for old in order]),
+            (self.key, [self.key[old] for old in order]),
+            (self.share, share),
+        ]:
+            field[:len(order)] = array(field.typecode, values)
+        self.size = len(order)
+        table = OrderedDict()
+        for key, old in self.table.items():
+            if old in newIndex:
+                table[key] = newIndex[old]
+            elif old in promoted:
+                table[key] = promoted[old]
+        self.table = table
+        self.untried = {newIndex[old]: moves for old, moves in self.untried.items() if old in newIndex}
+        return 0
+
+    def _grow(self):
+        """Doubles the length of the arrays, up to capacity."""
+
+        added = min(self.capacity, 2 * self.length) - self.length
+        for field in (
+            self.parent, self.move, self.first_child, self.next_sibling, self.child_count, self.visits,
+            self.value, self.amaf_visits, self.amaf_value, self.key, self.share,
+        ):
+            # every entry is set when its node is allocated
+            field.extend(array(field.typecode, [0]) * added)
+
+    def _allocate(self, parent: int, move: int, key: int | None) -> int:
+        node = self.size
+        if node == self.length:
+            self._grow()
+        self.parent[node] = parent
+        self.move[node] = move
+        self.first_child[node] = -1
+        self.next_sibling[node] = -1
+        self.child_count[node] = 0
+        self.visits[node] = 0
+        self.value[node] = 0
+        self.amaf_visits[node] = 0
+        self.amaf_value[node] = 0
+        self.key[node] = key or 0
+        shared = node
+        if key is not None:
+            shared = self.table.get(key, node)
+            if shared == node:
+                if len(self.table) >= self.max_transpositions:
+                    # a plain dict would scan past the deleted entries at its front
+                    self.table.popitem(last=False)
+                self.table[key] = node
+        self.share[node] = shared
+        self.size += 1
+        return node
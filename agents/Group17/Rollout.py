@@ -0,0 +1,91 @@
+from itertools import chain
+from random import sample
+
+from src.Colour import Colour
+
+
+class Rollout:
+    """Plays random simulations to the end of the game and finds who won.
+
+    A full board has exactly one winner, so it is enough to know whether red
+    connected the top and bottom rows, which a union-find over the red
+    stones answers. The tiles are flat indices x * board_size + y, with two
+    sentinel tiles after them for the top and bottom edges. Each tile's
+    neighbours are precomputed, keeping only those already visited when the
+    tiles are joined in index order, with the edge sentinels as extra
+    neighbours of the first and last rows. The buffers are reused from one
+    simulation to the next.
+    """
+
+    def __init__(self, board_size: int = 11):
+        self.board_size = board_size
+        tiles = board_size * board_size
+        self.top = tiles
+        self.bottom = tiles + 1
+
+        self._earlier_neighbours = []
+        for x in range(board_size):
+            for y in range(board_size):
+                neighbours = []
+                if x == 0:
+                    neighbours.append(self.top)
+                else:
+                    neighbours.append((x - 1) * board_size + y)
+                    if y + 1 < board_size:
+                        neighbours.append((x - 1) * board_size + y + 1)
+                if y > 0:
+                    neighbours.append(x * board_size + y - 1)
+                if x == board_size - 1:
+                    neighbours.append(self.bottom)
+                self._earlier_neighbours.append(neighbours)
+
+        # the sentinels count as red stones
+        self.cells = [None] * tiles + [Colour.RED, Colour.RED]
+        self._parent = list(range(tiles + 2))
+        self._no_parents = list(range(tiles + 2))
+
+    def play(self, state: list[list[Colour | None]], colour: Colour) -> bool:
+        """Fills the empty tiles of state at random, colour moving first, and
+        returns whether red won. The filled board is left in cells.
+        """
+
+        tiles = self.top
+        cells = self.cells
+        cells[:tiles] = chain.from_iterable(state)
+        empty = [tile for tile in range(tiles) if cells[tile] is None]
+        # the player moving first gets the odd stone, the other player the remaining tiles
+        for tile in sample(empty, (len(empty) + 1) // 2):
+            cells[tile] = colour
+        other = colour.opposite()
+        for tile in empty:
+            if cells[tile] is None:
+                cells[tile] = other
+        return self.red_connected()
+
+    def red_connected(self) -> bool:
+        """Returns whether the red stones in cells join the top and bottom edges."""
+
+        red = Colour.RED
+        cells = self.cells
+        parent = self._parent
+        parent[:] = self._no_parents
+        neighbours = self._earlier_neighbours
+        for tile in range(self.top):
+            if cells[tile] is not red:
+                continue
+            for other in neighbours[tile]:
+                if cells[other] is red:
+                    # find both roots, halving the paths on the way
+                    while parent[other] != other:
+                        parent[other] = other = parent[parent[other]]
+                    root = tile
+                    while parent[root] != root:
+                        parent[root] = root = parent[parent[root]]
+                    parent[root] = other
+        top = self.top
+        while parent[top] != top:
+            top = parent[top]
+        bottom = self.bottom
+        while parent[bottom] != bottom:
+            bottom = parent[bottom]
+        return top == bottom
@@ -176,10 +176,11 @@ def winvalue(B: Board, player: Colour):
         cell = M.pop()
 
         # Simulate the board after placing the player's stone in cell m
-        B_next = make_move(B, cell, player)
+        B.play(cell[0], cell[1], player)
 
         # Recursive call to evaluate the opponent's response
-        v, S = winvalue(B_next, opponent)
+        v, S = winvalue(B, opponent)
+        B.undo()
 
         if v == -1:
             return (+1, S.union({cell}))
@@ -204,12 +205,6 @@ def get_unoccupied_cells(B: Board) -> set[tuple[int, int]]:
 
     return unoccupied_cells
 
-def make_move(B: Board, cell: tuple[int, int], player: Colour):
-    x, y = cell
-    B.tiles[x][y].colour = player
-    return B
-
-
 def select_best_move(B: Board, player: Colour) -> Move:
     """
     Selects the best move for the agent using the winvalue algorithm.
@@ -227,12 +222,12 @@ def select_best_move(B: Board, player: Colour) -> Move:
     smallest_win_set_size = math.inf
 
     for cell in unoccupied_cells:
-        # Create a deep copy of the board to simulate the move
-        simulated_board = copy.deepcopy(B)
-        make_move(simulated_board, cell, player)
+        # Simulate the move on the board, then take it back
+        B.play(cell[0], cell[1], player)
 
         # Evaluate the board state after the simulated move
-        value, win_set = winvalue(simulated_board, get_opponent(player))
+        value, win_set = winvalue(B, get_opponent(player))
+        B.undo()
 
         # If this move guarantees a win, return it immediately
         if value == +1:
@@ -1,7 +1,6 @@
 from random import choice
 import time
 import math
-import copy
 
 from src.AgentBase import AgentBase
 from src.Board import Board
@@ -47,12 +46,12 @@ def winvalue(B: Board, player: Colour):
         # print("loop" + str(loop))
         cell = M.pop()
 
-        B_next = copy.deepcopy(B)
         # Simulate the board after placing the player's stone in cell m
-        B_next = sim_move(B, cell, player)
+        B.play(cell[0], cell[1], player)
 
         # Recursive call to evaluate the opponent's response
-        v, S = winvalue(B_next, opponent)
+        v, S = winvalue(B, opponent)
+        B.undo()
 
         if v == -1:
             return (+1, S.union({cell}))
@@ -78,11 +77,6 @@ def get_unoccupied_cells(B: Board) -> set[tuple[int, int]]:
 
     return unoccupied_cells
 
-def sim_move(SIM_B: Board, cell: tuple[int, int], player: Colour):
-    x, y = cell
-    SIM_B.tiles[x][y].colour = player
-    return SIM_B
-
 def select_best_move(B: Board, player: Colour) -> Move:
     """
     Selects the best move for the agent using the winvalue algorithm.
@@ -100,12 +94,12 @@ def select_best_move(B: Board, player: Colour) -> Move:
     smallest_win_set_size = math.inf
 
     for cell in unoccupied_cells:
-        # Create a deep copy of the board to simulate the move
-        simulated_board = copy.deepcopy(B)
-        sim_move(simulated_board, cell, player)
+        # Simulate the move on the board, then take it back
+        B.play(cell[0], cell[1], player)
 
         # Evaluate the board state after the simulated move
-        value, win_set = winvalue(simulated_board, get_opponent(player))
+        value, win_set = winvalue(B, get_opponent(player))
+        B.undo()
 
         # If this move guarantees a loss
         if value == -1:
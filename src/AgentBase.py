@@ -1,5 +1,6 @@
 import inspect
 from abc import ABC, abstractmethod
+from threading import Event
 
 from src.Board import Board
 from src.Colour import Colour
@@ -18,6 +19,18 @@ class AgentBase(ABC):
         """Makes a move based on the current board state."""
         pass
 
+    def ponder(self, board: Board, stop_event: Event) -> None:
+        """Optional hook to think on the opponent's time.
+
+        If the game has pondering enabled, which requires each agent to run
+        in its own process, it is called in a background thread of that
+        process after each of the agent's moves, with the board the opponent
+        is to move on, and stop_event is set before the agent is asked for
+        its next move. It should return promptly once stop_event is set, as
+        the wait counts towards the agent's move time.
+        """
+        pass
+
     @property
     def colour(self) -> Colour:
         return self._colour
@@ -39,4 +52,14 @@ class AgentBase(ABC):
             raise ValueError(f"Invalid colour: {self._colour}")
 
     def __hash__(self) -> int:
-        return hash(inspect.getsource(self.__class__))
+        # classes made at runtime, e.g. agents with overridden attributes, have
+        # no source: their attributes are hashed with the nearest source instead
+        attributes = []
+        for agentClass in self.__class__.__mro__:
+            try:
+                return hash((inspect.getsource(agentClass), tuple(attributes)))
+            except (OSError, TypeError):
+                attributes.extend(
+                    sorted((name, repr(value)) for name, value in vars(agentClass).items() if not name.startswith("__"))
+                )
+        return hash(tuple(attributes))
@@ -0,0 +1,134 @@
+import os
+import signal
+import traceback
+from multiprocessing import Pipe
+from threading import Event, Thread
+
+from src.AgentBase import AgentBase
+from src.Board import Board
+from src.Move import Move
+
+
+class AgentProcess:
+    """Runs an agent in a process of its own, so that the game can stop
+    waiting for a move at a deadline and kill the agent.
+
+    The process is forked from the game's, so the agent keeps whatever state
+    it has, and forking also works inside the daemonic workers of a
+    tournament pool, which may not start multiprocessing children.
+    """
+
+    def __init__(self, agent: AgentBase, ponder: bool = False):
+        self.agent = agent
+        # whether the agent ran out of time for a move and was killed
+        self.timed_out = False
+        self._connection, childConnection = Pipe()
+        self.pid = os.fork()
+        if self.pid == 0:
+            self._connection.close()
+            try:
+                _serve_agent(agent, childConnection, ponder)
+            finally:
+                os._exit(0)
+        childConnection.close()
+
+    def make_move(self, turn: int, board: Board, opp_move: Move | None, timeout: float | None = None) -> Move | None:
+        """Asks the agent for its move and waits for at most timeout seconds.
+
+        Returns:
+            Move | None: the agent's move, or None if the agent ran out of
+                time, in which case timed_out is set and its process has
+                been killed. An agent can also return None as its move.
+        """
+
+        self._connection.send((turn, board, opp_move, self.agent.colour))
+        if not self._connection.poll(timeout):
+            self.timed_out = True
+            self.close()
+            return None
+
+        try:
+            ok, reply = self._connection.recv()
+        except EOFError:
+            raise RuntimeError("Agent process exited during its move")
+        if not ok:
+            raise RuntimeError(f"Agent raised an exception:\n{reply}")
+        return reply
+
+    def close(self):
+        """Kills the agent process."""
+
+        if self.pid is None:
+            return
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+            os.waitpid(self.pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+        self._connection.close()
+        self.pid = None
+
+
+class Ponderer:
+    """Runs the ponder hook of an agent in a background thread until it is
+    stopped. Nothing is started for agents that do not override the hook.
+    """
+
+    def __init__(self, agent: AgentBase, board: Board):
+        self.stop_event = Event()
+        self.thread = None
+        if type(agent).ponder is not AgentBase.ponder:
+            self.thread = Thread(target=agent.ponder, args=(board, self.stop_event), daemon=True)
+            self.thread.start()
+
+    @staticmethod
+    def after_move(agent: AgentBase, board: Board, move: Move) -> "Ponderer | None":
+        """Starts pondering on the board the agent's move leads to, if the
+        move is legal.
+        """
+
+        board = board.copy()
+        if move.x == -1 and move.y == -1:
+            board.record_swap()
+        elif 0 <= move.x < board.size and 0 <= move.y < board.size and board.get_tile_colour(move.x, move.y) is None:
+            board.set_tile_colour(move.x, move.y, agent.colour)
+        else:
+            # an illegal move ends the game
+            return None
+        return Ponderer(agent, board)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def _serve_agent(agent: AgentBase, connection, ponder: bool):
+    """Loop of the agent process: plays the moves asked for by the game
+    until the game closes the connection, pondering between them if asked to.
+    """
+
+    ponderer = None
+    while True:
+        try:
+            turn, board, opp_move, colour = connection.recv()
+        except EOFError:
+            return
+
+        if ponderer is not None:
+            ponderer.stop()
+            ponderer = None
+        # the game changes the agent's colour when a player swaps
+        agent.colour = colour
+        try:
+            move = agent.make_move(turn, board, opp_move)
+        except Exception:
+            connection.send((False, traceback.format_exc()))
+            continue
+
+        connection.send((True, move))
+        if ponder:
+            # after a swap the agent plays the other colour
+            if move.x == -1 and move.y == -1:
+                agent.colour = colour.opposite()
+            ponderer = Ponderer.after_move(agent, board, move)
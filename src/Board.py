@@ -1,25 +1,87 @@
 from src.Colour import Colour
 from src.Tile import Tile
 
+MASK_64 = (1 << 64) - 1
+
+
+def splitmix64(seed: int) -> int:
+    """The SplitMix64 output for the given 64-bit state, from which the
+    Zobrist keys are made.
+    """
+
+    z = (seed + 0x9E3779B97F4A7C15) & MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return z ^ (z >> 31)
+
 
 class Board:
-    """Class that describes the Hex board."""
+    """Class that describes the Hex board.
+
+    Stones are stored as two bitboards, one per colour, where the tile at
+    (x, y) is bit x * size + y. Tile objects are only views onto these
+    bitboards and are created the first time Board.tiles is accessed.
+
+    Win detection is incremental: the board keeps a union-find forest over
+    its tiles plus four virtual nodes, one per side, which is updated in
+    set_tile_colour.
+
+    For search, play and undo place and take back stones without copying
+    the board. While moves are on the undo stack the union-find does no
+    path compression, so each undo only has to reverse its own unions.
+    Calling set_tile_colour makes all pending moves permanent.
+
+    The board also carries a 64-bit Zobrist hash of its stones and of
+    whether the swap move has been played. The side to move follows from
+    the number of stones, as RED always moves first and a swap does not
+    place a stone, so it needs no key of its own. The keys are defined so
+    that other programs can compute the same hash: a RED stone on tile
+    i = x * size + y has the key splitmix64(2 * i), a BLUE one
+    splitmix64(2 * i + 1), and the swap move splitmix64(2 * size * size).
+    """
+
+    # Zobrist keys per board size: (red keys, blue keys, swap key)
+    _ZOBRIST_KEYS: dict[int, tuple[list[int], list[int], int]] = {}
+    # bit interleaving masks for the packed format, per padded tile count
+    _PACKING_MASKS: dict[int, dict[int, int]] = {}
+
+    # protocol characters, and translation tables between them and bits
+    _PROTOCOL_RED_BITS = str.maketrans("RB0", "100")
+    _PROTOCOL_BLUE_BITS = str.maketrans("RB0", "010")
+    _PROTOCOL_CHARS = bytes.maketrans(b"012", b"0RB")
 
     _size: int
-    _tiles: list[list[Tile]]
+    _red: int
+    _blue: int
+    _swapped: bool
+    _hash: int
+    _tiles: list[list[Tile]] | None
     _winner: Colour | None
+    _parent: list[int]
+    _set_size: list[int]
+    _history: list[tuple[int, int, Colour, Colour | None, list[tuple[int, int]]]]
 
     def __init__(self, board_size=11):
         self._size = board_size
-
-        self._tiles = []
+        self._red = 0
+        self._blue = 0
+        self._swapped = False
+        self._hash = 0
+        self._tiles = None
+
+        self._full_mask = (1 << (board_size * board_size)) - 1
+        # tiles that have a neighbour to their right / left respectively
+        last_column = 0
+        first_column = 0
         for i in range(board_size):
-            new_line = []
-            for j in range(board_size):
-                new_line.append(Tile(i, j))
-            self._tiles.append(new_line)
+            last_column |= 1 << (i * board_size + board_size - 1)
+            first_column |= 1 << (i * board_size)
+        self._not_last_column = self._full_mask & ~last_column
+        self._not_first_column = self._full_mask & ~first_column
 
         self._winner = None
+        self._history = []
+        self._reset_union_find()
 
     def __str__(self) -> str:
         return self.print_board()
@@ -28,20 +90,39 @@ class Board:
         if not isinstance(value, Board):
             return False
 
-        if self._size != value.size:
-            return False
+        return self.fingerprint == value.fingerprint
 
-        for i in range(self._size):
-            for j in range(self._size):
-                if self.tiles[i][j].colour != value.tiles[i][j].colour:
-                    return False
+    def __hash__(self) -> int:
+        return self._hash
 
-        return True
+    def __deepcopy__(self, memo) -> "Board":
+        return self.copy()
+
+    def copy(self) -> "Board":
+        """Returns an independent copy of the board. Tile views are not
+        copied, the copy builds its own on demand.
+        """
+
+        b = Board.__new__(Board)
+        b._size = self._size
+        b._red = self._red
+        b._blue = self._blue
+        b._swapped = self._swapped
+        b._hash = self._hash
+        b._tiles = None
+        b._full_mask = self._full_mask
+        b._not_last_column = self._not_last_column
+        b._not_first_column = self._not_first_column
+        b._winner = self._winner
+        b._parent = self._parent.copy()
+        b._set_size = self._set_size.copy()
+        b._history = self._history.copy()
+        return b
 
     def from_string(string_input, board_size=11):
-        """Loads a board from a string representation. If bnf=True, it will
-        load a protocol-formatted string. Otherwise, it will load from a
-        human-readable-formatted board.
+        """Loads a board from its human-readable representation, as
+        printed by print_board without colours. See from_protocol_string
+        for the protocol format.
         """
 
         b = Board(board_size=board_size)
@@ -50,83 +131,125 @@ class Board:
         for i, line in enumerate(lines):
             chars = line.split(" ")
             for j, char in enumerate(chars):
-                b.tiles[i][j].colour = Colour.from_char(char)
+                b.set_tile_colour(i, j, Colour.from_char(char))
         return b
 
-    def has_ended(self, colour: Colour = None):
-        """Checks if the game has ended. It will attempt to find a red chain
-        from top to bottom or a blue chain from left to right of the board.
+    def to_protocol_string(self) -> str:
+        """Returns the board in the agent protocol format: one string of
+        R, B and 0 characters per row, rows separated by commas.
         """
 
-        # Red
-        # for all top tiles, check if they connect to bottom
-        if colour == Colour.RED:
-            for idx in range(self._size):
-                tile = self._tiles[0][idx]
-                if not tile.is_visited() and tile.colour == Colour.RED and self._winner is None:
-                    self.DFS_colour(0, idx, Colour.RED)
-        # Blue
-        # for all left tiles, check if they connect to right
-        elif colour == Colour.BLUE:
-            for idx in range(self._size):
-                tile = self._tiles[idx][0]
-                if not tile.is_visited() and tile.colour == Colour.BLUE and self._winner is None:
-                    self.DFS_colour(idx, 0, Colour.BLUE)
-        else:
-            raise ValueError("Invalid colour")
+        tile_count = self._size * self._size
+        # one byte per tile, "0", "1" or "2", added up without carries
+        red = int.from_bytes(format(self._red, "b").zfill(tile_count)[::-1].encode(), "big")
+        blue = int.from_bytes(format(self._blue, "b").zfill(tile_count)[::-1].encode(), "big")
+        zeros = int.from_bytes(b"0" * tile_count, "big")
+        cells = (red + 2 * (blue - zeros)).to_bytes(tile_count, "big").translate(Board._PROTOCOL_CHARS).decode()
+        return ",".join(cells[i:i + self._size] for i in range(0, tile_count, self._size))
+
+    @staticmethod
+    def from_protocol_string(string_input: str) -> "Board":
+        """Loads a board from the agent protocol format, see
+        to_protocol_string. The board size is the number of rows.
+        """
 
-        # un-visit tiles
-        self.clear_tiles()
+        board_size = string_input.count(",") + 1
+        cells = string_input.strip().replace(",", "")
+        if len(cells) != board_size * board_size or cells.strip("RB0"):
+            raise ValueError(f"Invalid protocol board: {string_input!r}")
 
-        return self._winner is not None
+        b = Board(board_size)
+        b._load_bitboards(
+            int(cells.translate(Board._PROTOCOL_RED_BITS)[::-1], 2),
+            int(cells.translate(Board._PROTOCOL_BLUE_BITS)[::-1], 2),
+        )
+        return b
 
-    def clear_tiles(self):
-        """Clears the visited status from all tiles."""
+    def to_bytes(self) -> bytes:
+        """Packs the board into bytes: the board size, a flags byte (1 if
+        the swap move has been played), then 2 bits per tile in tile order,
+        0 for empty, 1 for red and 2 for blue.
+        """
 
-        for line in self._tiles:
-            for tile in line:
-                tile.clear_visit()
+        tile_count = self._size * self._size
+        packed = self._spread(self._red) | (self._spread(self._blue) << 1)
+        return bytes((self._size, int(self._swapped))) + packed.to_bytes((tile_count + 3) // 4, "little")
 
-    def DFS_colour(self, x, y, colour):
-        """A recursive DFS method that iterates through connected same-colour
-        tiles until it finds a bottom tile (Red) or a right tile (Blue).
+    @staticmethod
+    def from_bytes(data) -> "Board":
+        """Loads a board packed by to_bytes from any bytes-like object,
+        reading it through a memoryview without copying it.
         """
 
-        self._tiles[x][y].visit()
+        view = memoryview(data)
+        board_size = view[0]
+        tile_count = board_size * board_size
+        if len(view) != 2 + (tile_count + 3) // 4:
+            raise ValueError("Invalid packed board length")
+
+        packed = int.from_bytes(view[2:], "little")
+        b = Board(board_size)
+        red = b._compact(packed)
+        blue = b._compact(packed >> 1)
+        if red & blue or (red | blue) >> tile_count:
+            raise ValueError("Invalid packed board contents")
+
+        b._load_bitboards(red, blue)
+        if view[1] & 1:
+            b.record_swap()
+        return b
 
-        # win conditions
+    def has_ended(self, colour: Colour = None):
+        """Checks if the game has ended. A red chain connects the top and
+        bottom virtual nodes, a blue chain connects the left and right ones,
+        so this is a pair of union-find lookups.
+        """
+
+        top, bottom, left, right = self._edge_nodes()
         if colour == Colour.RED:
-            if x == self._size - 1:
-                self._winner = colour
+            connected = self._find(top) == self._find(bottom)
         elif colour == Colour.BLUE:
-            if y == self._size - 1:
-                self._winner = colour
+            connected = self._find(left) == self._find(right)
         else:
-            return
+            raise ValueError("Invalid colour")
 
-        # end condition
-        if self._winner is not None:
-            return
+        if connected and self._winner is None:
+            self._winner = colour
 
-        # visit neighbours
-        for idx in range(Tile.NEIGHBOUR_COUNT):
-            x_n = x + Tile.I_DISPLACEMENTS[idx]
-            y_n = y + Tile.J_DISPLACEMENTS[idx]
-            if x_n >= 0 and x_n < self._size and y_n >= 0 and y_n < self._size:
-                neighbour = self._tiles[x_n][y_n]
-                if not neighbour.is_visited() and neighbour.colour == colour:
-                    self.DFS_colour(x_n, y_n, colour)
+        return self._winner is not None
+
+    def is_connected(self, colour: Colour) -> bool:
+        """Checks whether colour connects its two sides with a bitmask
+        flood fill, independently of the union-find. Works for any board
+        size and stops as soon as the far side is reached.
+        """
+
+        start, end = self._side_masks(colour)
+        return bool(self.flood(start, colour, end) & end)
+
+    def flood(self, seeds: int, colour: Colour, targets: int = 0) -> int:
+        """Returns the bitboard of the tiles of colour connected to a tile
+        in seeds. The fill stops early once it reaches a tile in targets.
+        """
+
+        stones = self.stones(colour)
+        reached = seeds & stones
+        frontier = reached
+        while frontier and not reached & targets:
+            frontier = self.neighbours(frontier) & stones & ~reached
+            reached |= frontier
+        return reached
 
     def print_board(self) -> str:
         """Returns the string representation of a board."""
 
         output = ""
         leading_spaces = ""
-        for line in self._tiles:
+        for i in range(self._size):
             output += leading_spaces
             leading_spaces += " "
-            for tile in line:
-                output += Colour.get_char(tile.colour) + " "
+            for j in range(self._size):
+                output += Colour.get_char(self.get_tile_colour(i, j)) + " "
             output += "\n"
 
         return output
@@ -138,20 +261,316 @@ class Board:
     def size(self) -> int:
         return self._size
 
+    @property
+    def fingerprint(self) -> tuple[int, int, int, bool]:
+        """An immutable value that identifies the position, cheap to take
+        and to compare. Two boards are equal iff their fingerprints are.
+        """
+
+        return self._size, self._red, self._blue, self._swapped
+
+    @property
+    def zobrist_hash(self) -> int:
+        """The 64-bit Zobrist hash of the position. Keys are fixed, see
+        the class docstring, so the hash is stable across processes and runs.
+        """
+
+        return self._hash
+
+    @property
+    def swapped(self) -> bool:
+        return self._swapped
+
+    def record_swap(self) -> None:
+        """Marks the swap move as played. Swapping exchanges the players,
+        not the stones, so only the hash changes.
+        """
+
+        if not self._swapped:
+            self._swapped = True
+            self._hash ^= self._zobrist_keys()[2]
+
     @property
     def tiles(self) -> list[list[Tile]]:
+        if self._tiles is None:
+            self._tiles = [[Tile(i, j, _board=self) for j in range(self._size)] for i in range(self._size)]
         return self._tiles
 
+    def stones(self, colour: Colour) -> int:
+        """Returns the bitboard of the tiles occupied by the given colour."""
+
+        if colour == Colour.RED:
+            return self._red
+        elif colour == Colour.BLUE:
+            return self._blue
+        else:
+            raise ValueError("Invalid colour")
+
+    def empty(self) -> int:
+        """Returns the bitboard of the unoccupied tiles."""
+
+        return self._full_mask & ~(self._red | self._blue)
+
+    def neighbours(self, mask: int) -> int:
+        """Returns the bitboard of all tiles adjacent to a tile in mask,
+        excluding the tiles of mask itself.
+        """
+
+        size = self._size
+        left_shiftable = mask & self._not_first_column
+        right_shiftable = mask & self._not_last_column
+        spread = (
+            (mask >> size)
+            | (mask << size)
+            | (right_shiftable << 1)
+            | (left_shiftable >> 1)
+            | (right_shiftable >> (size - 1))
+            | (left_shiftable << (size - 1))
+        )
+        return spread & self._full_mask & ~mask
+
+    def get_tile_colour(self, x, y) -> Colour | None:
+        bit = 1 << (x * self._size + y)
+        if self._red & bit:
+            return Colour.RED
+        elif self._blue & bit:
+            return Colour.BLUE
+        else:
+            return None
+
     def set_tile_colour(self, x, y, colour) -> None:
-        self.tiles[x][y].colour = colour
+        previous = self.get_tile_colour(x, y)
+        if previous == colour:
+            return
+
+        self._history = []
+        self._place(x, y, previous, colour)
+        if previous is not None:
+            # sets cannot be split, so overwriting a stone needs a rebuild
+            self._reset_union_find()
+        else:
+            self._connect(x, y, colour)
+
+    def play(self, x, y, colour) -> None:
+        """Places a stone on an empty tile, so that it can be taken back
+        with undo.
+        """
+
+        if colour is None:
+            raise ValueError("Invalid colour")
+        if self.get_tile_colour(x, y) is not None:
+            raise ValueError(f"Tile ({x}, {y}) is already occupied")
+
+        merges = []
+        self._history.append((x, y, colour, self._winner, merges))
+        self._place(x, y, None, colour)
+        self._connect(x, y, colour, merges)
+
+    def undo(self) -> None:
+        """Takes back the last stone placed with play, including its effect
+        on win detection.
+        """
+
+        if not self._history:
+            raise IndexError("No move to undo")
+
+        x, y, colour, winner, merges = self._history.pop()
+        for child, root in reversed(merges):
+            self._parent[child] = child
+            self._set_size[root] -= self._set_size[child]
+        self._place(x, y, colour, None)
+        self._winner = winner
+
+    def _place(self, x, y, previous, colour) -> None:
+        """Updates the bitboards and the hash for a tile changing from
+        previous to colour.
+        """
+
+        index = x * self._size + y
+        bit = 1 << index
+        red_keys, blue_keys, _ = self._zobrist_keys()
+        self._red &= ~bit
+        self._blue &= ~bit
+        if previous == Colour.RED:
+            self._hash ^= red_keys[index]
+        elif previous == Colour.BLUE:
+            self._hash ^= blue_keys[index]
+        if colour == Colour.RED:
+            self._red |= bit
+            self._hash ^= red_keys[index]
+        elif colour == Colour.BLUE:
+            self._blue |= bit
+            self._hash ^= blue_keys[index]
+
+    def _load_bitboards(self, red: int, blue: int) -> None:
+        """Fills an empty board from two bitboards."""
+
+        self._red = red
+        self._blue = blue
+
+        red_keys, blue_keys, _ = self._zobrist_keys()
+        for keys, stones in ((red_keys, red), (blue_keys, blue)):
+            while stones:
+                low_bit = stones & -stones
+                self._hash ^= keys[low_bit.bit_length() - 1]
+                stones ^= low_bit
+
+        self._reset_union_find()
+
+    def _packing_masks(self) -> dict[int, int]:
+        """Returns the masks used to interleave a bitboard with zero bits,
+        keyed by the width of the runs of ones they keep.
+        """
+
+        padded = 1
+        while padded < self._size * self._size:
+            padded *= 2
+
+        masks = Board._PACKING_MASKS.get(padded)
+        if masks is None:
+            masks = {}
+            width = 1
+            while width <= padded:
+                masks[width] = int(("0" * width + "1" * width) * (padded // width), 2)
+                width *= 2
+            Board._PACKING_MASKS[padded] = masks
+        return masks
+
+    def _spread(self, stones: int) -> int:
+        """Moves bit i of stones to bit 2i."""
+
+        masks = self._packing_masks()
+        width = max(masks) // 2
+        while width >= 1:
+            stones = (stones | (stones << width)) & masks[width]
+            width //= 2
+        return stones
+
+    def _compact(self, packed: int) -> int:
+        """Moves bit 2i of packed to bit i, the inverse of _spread."""
+
+        masks = self._packing_masks()
+        packed &= masks[1]
+        width = 1
+        while width < max(masks):
+            packed = (packed | (packed >> width)) & masks[width * 2]
+            width *= 2
+        return packed
+
+    def _side_masks(self, colour: Colour) -> tuple[int, int]:
+        """Returns the bitboards of the two sides colour has to connect:
+        top and bottom rows for Red, left and right columns for Blue.
+        """
+
+        if colour == Colour.RED:
+            top = (1 << self._size) - 1
+            return top, top << (self._size * (self._size - 1))
+        elif colour == Colour.BLUE:
+            return self._full_mask & ~self._not_first_column, self._full_mask & ~self._not_last_column
+        else:
+            raise ValueError("Invalid colour")
+
+    def _zobrist_keys(self) -> tuple[list[int], list[int], int]:
+        """Returns the Zobrist keys for this board size, generating them
+        the first time the size is used.
+        """
+
+        keys = Board._ZOBRIST_KEYS.get(self._size)
+        if keys is None:
+            tile_count = self._size * self._size
+            keys = (
+                [splitmix64(2 * tile) for tile in range(tile_count)],
+                [splitmix64(2 * tile + 1) for tile in range(tile_count)],
+                splitmix64(2 * tile_count),
+            )
+            Board._ZOBRIST_KEYS[self._size] = keys
+        return keys
+
+    def _edge_nodes(self) -> tuple[int, int, int, int]:
+        """Returns the indices of the top, bottom, left and right virtual
+        nodes, which sit after the tiles in the union-find arrays.
+        """
+
+        first = self._size * self._size
+        return first, first + 1, first + 2, first + 3
+
+    def _reset_union_find(self) -> None:
+        """Rebuilds the union-find forest from the current bitboards."""
+
+        node_count = self._size * self._size + 4
+        self._parent = list(range(node_count))
+        self._set_size = [1] * node_count
+
+        for colour, stones in ((Colour.RED, self._red), (Colour.BLUE, self._blue)):
+            while stones:
+                low_bit = stones & -stones
+                x, y = divmod(low_bit.bit_length() - 1, self._size)
+                self._connect(x, y, colour)
+                stones ^= low_bit
+
+    def _find(self, node: int) -> int:
+        """Returns the root of the set containing node, halving the path
+        on the way up unless there are moves to undo.
+        """
+
+        parent = self._parent
+        if self._history:
+            while parent[node] != node:
+                node = parent[node]
+            return node
+
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def _union(self, a: int, b: int, merges: list[tuple[int, int]] | None = None) -> None:
+        """Merges the sets containing a and b, by size. The (child, root)
+        pair is appended to merges if given.
+        """
+
+        root_a = self._find(a)
+        root_b = self._find(b)
+        if root_a == root_b:
+            return
+        if self._set_size[root_a] < self._set_size[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._set_size[root_a] += self._set_size[root_b]
+        if merges is not None:
+            merges.append((root_b, root_a))
+
+    def _connect(self, x, y, colour, merges: list[tuple[int, int]] | None = None) -> None:
+        """Joins a newly coloured tile to its same-colour neighbours and to
+        the virtual nodes of the sides it touches.
+        """
+
+        node = x * self._size + y
+        top, bottom, left, right = self._edge_nodes()
+
+        if colour == Colour.RED:
+            if x == 0:
+                self._union(node, top, merges)
+            if x == self._size - 1:
+                self._union(node, bottom, merges)
+        elif colour == Colour.BLUE:
+            if y == 0:
+                self._union(node, left, merges)
+            if y == self._size - 1:
+                self._union(node, right, merges)
+
+        friends = self.neighbours(1 << node) & self.stones(colour)
+        while friends:
+            low_bit = friends & -friends
+            self._union(node, low_bit.bit_length() - 1, merges)
+            friends ^= low_bit
 
 
 if __name__ == "__main__":
-    b = Board.from_string(
+    b = Board.from_protocol_string(
         "0R000B00000,0R000000000,0RBB0000000,0R000000000,0R00B000000,"
         + "0R000BB0000,0R0000B0000,0R00000B000,0R000000B00,0R0000000B0,"
-        + "0R00000000B",
-        bnf=True,
+        + "0R00000000B"
     )
-    b.print_board(bnf=False)
-    print(b.has_ended(), b.get_winner())
+    print(b.print_board())
+    print(b.has_ended(Colour.RED), b.get_winner())
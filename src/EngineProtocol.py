@@ -0,0 +1,244 @@
+import struct
+import sys
+from subprocess import PIPE, Popen
+
+from src.Board import Board
+from src.Colour import Colour
+from src.Move import Move
+
+# latest version of the protocol, version 1 is the original one
+PROTOCOL_VERSION = 2
+
+# opcodes of the binary frames
+START, MOVE, BOARD = 1, 2, 3
+# request frame: opcode, x, y, turn, checksum; a BOARD frame is followed by
+# the colour of the engine (1 for RED, 2 for BLUE) and Board.to_bytes()
+REQUEST_FRAME = struct.Struct(">BbbHQ")
+# reply frame: x, y
+REPLY_FRAME = struct.Struct(">bb")
+# reply of an engine whose board does not match the checksum
+RESYNC = Move(-2, -2)
+
+
+def board_checksum(board: Board) -> int:
+    """Returns the checksum an engine compares with its own board to detect
+    a desync: the board's 64-bit Zobrist hash, which is updated with each
+    move instead of being computed from the whole board. See Board for how
+    engines can compute it.
+    """
+
+    return board.zobrist_hash
+
+
+class EngineConnection:
+    """Connection to an external engine process that plays over stdin and
+    stdout.
+
+    Version 1 sends the whole board as a string every turn:
+
+        START;;<board>;<turn>;  SWAP;;<board>;<turn>;  CHANGE;x,y;<board>;<turn>;
+
+    Version 2 starts with a handshake, HELLO;2;<R|B>;<size>;<T|B> answered
+    by HELLO;2, after which only the opponent's move is sent, with the
+    checksum of the board it leads to:
+
+        START;;<turn>;<checksum>  MOVE;x,y;<turn>;<checksum>
+
+    The engine keeps its own board. If the checksum does not match it, the
+    engine replies RESYNC and is sent the whole board:
+
+        BOARD;<board>;<R|B>;<turn>;<checksum>
+
+    The checksum is the Zobrist hash of the board, see board_checksum, so
+    both sides update it with each move. The whole board is also sent
+    whenever the board does not follow from the previous one, e.g. when the
+    agent is reused for a new game. With B in the handshake, the messages
+    after it are binary frames, see REQUEST_FRAME and REPLY_FRAME. In every
+    version the engine replies with the move x,y, which is -1,-1 to swap.
+    """
+
+    def __init__(self, args: list[str], colour: Colour, board_size: int = 11, version: int = 1, binary: bool = False):
+        if version not in (1, PROTOCOL_VERSION):
+            raise ValueError(f"Unsupported protocol version {version}")
+
+        self.version = version
+        self.binary = binary and version > 1
+        self.process = Popen(args, stdout=PIPE, stdin=PIPE, bufsize=0)
+        # the board as the engine knows it, None if it needs the whole board
+        self._board = None
+
+        if version > 1:
+            self._write_line(f"HELLO;{version};{colour.name[0]};{board_size};{'B' if self.binary else 'T'}")
+            response = self._read_line()
+            if response != f"HELLO;{version}":
+                raise ConnectionError(f"Engine does not support protocol version {version}: {response!r}")
+            self._board = Board(board_size)
+
+    def request_move(self, turn: int, board: Board, opp_move: Move | None, colour: Colour) -> Move:
+        """Sends the board after the opponent's move to the engine and
+        returns the engine's move.
+        """
+
+        if self.version == 1:
+            return self._request_move_v1(turn, board, opp_move)
+
+        expected = self._board
+        if expected is not None and opp_move is not None:
+            if opp_move.x == -1 and opp_move.y == -1:
+                expected.record_swap()
+            elif expected.get_tile_colour(opp_move.x, opp_move.y) is None:
+                expected.set_tile_colour(opp_move.x, opp_move.y, colour.opposite())
+            else:
+                expected = None
+
+        checksum = board_checksum(board)
+        if expected is not None and expected == board:
+            self._send_move(turn, opp_move, checksum)
+            move = self._read_move()
+        else:
+            move = RESYNC
+        if move == RESYNC:
+            self._send_board(turn, board, colour, checksum)
+            move = self._read_move()
+            expected = None
+
+        # the game applies the engine's move after this returns
+        self._board = expected if expected is not None else board.copy()
+        if move.x == -1 and move.y == -1:
+            self._board.record_swap()
+        elif 0 <= move.x < board.size and 0 <= move.y < board.size and board.get_tile_colour(move.x, move.y) is None:
+            self._board.set_tile_colour(move.x, move.y, colour)
+        else:
+            # an illegal move ends the game
+            self._board = None
+        return move
+
+    def close(self):
+        self.process.kill()
+        self.process.wait()
+
+    def _request_move_v1(self, turn: int, board: Board, opp_move: Move | None) -> Move:
+        board_string = board.to_protocol_string()
+
+        if opp_move is None:
+            command = f"START;;{board_string};{turn};"
+        elif opp_move.x == -1 and opp_move.y == -1:
+            command = f"SWAP;;{board_string};{turn};"
+        else:
+            command = f"CHANGE;{opp_move.x},{opp_move.y};{board_string};{turn};"
+
+        self._write_line(command)
+        return self._read_move()
+
+    def _send_move(self, turn: int, opp_move: Move | None, checksum: int):
+        if self.binary:
+            if opp_move is None:
+                frame = REQUEST_FRAME.pack(START, 0, 0, turn, checksum)
+            else:
+                frame = REQUEST_FRAME.pack(MOVE, opp_move.x, opp_move.y, turn, checksum)
+            self.process.stdin.write(frame)
+        elif opp_move is None:
+            self._write_line(f"START;;{turn};{checksum}")
+        else:
+            self._write_line(f"MOVE;{opp_move.x},{opp_move.y};{turn};{checksum}")
+
+    def _send_board(self, turn: int, board: Board, colour: Colour, checksum: int):
+        if self.binary:
+            frame = REQUEST_FRAME.pack(BOARD, 0, 0, turn, checksum)
+            self.process.stdin.write(frame + bytes([colour.value + 1]) + board.to_bytes())
+        else:
+            self._write_line(f"BOARD;{board.to_protocol_string()};{colour.name[0]};{turn};{checksum}")
+
+    def _read_move(self) -> Move:
+        if self.binary:
+            reply = self.process.stdout.read(REPLY_FRAME.size)
+            if len(reply) < REPLY_FRAME.size:
+                raise ConnectionError("Engine closed the connection")
+            return Move(*REPLY_FRAME.unpack(reply))
+
+        response = self._read_line()
+        if response == "RESYNC":
+            return RESYNC
+        # the response takes the form "x,y" with -1,-1 if the engine wants to make a swap move
+        x, y = response.split(",")
+        return Move(int(x), int(y))
+
+    def _write_line(self, line: str):
+        self.process.stdin.write(line.encode() + b"\n")
+
+    def _read_line(self) -> str:
+        return self.process.stdout.readline().decode().rstrip()
+
+
+def serve_engine(choose_move, stdin=None, stdout=None):
+    """Engine side of protocol version 2, for engines written in Python.
+
+    Keeps the engine's board up to date from the messages on stdin and
+    writes the move returned by choose_move(board, colour, turn) to stdout.
+    """
+
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+
+    _, version, colour, board_size, framing = stdin.readline().decode().strip().split(";")
+    if int(version) != PROTOCOL_VERSION:
+        return
+    stdout.write(f"HELLO;{PROTOCOL_VERSION}\n".encode())
+    stdout.flush()
+    colour = Colour.from_char(colour)
+    board_size = int(board_size)
+    binary = framing == "B"
+    board = Board(board_size)
+    # the whole board when it follows a BOARD frame
+    board_bytes = 2 + (board_size * board_size + 3) // 4
+
+    while True:
+        if binary:
+            frame = stdin.read(REQUEST_FRAME.size)
+            if len(frame) < REQUEST_FRAME.size:
+                return
+            opcode, x, y, turn, checksum = REQUEST_FRAME.unpack(frame)
+            if opcode == BOARD:
+                colour = Colour.RED if stdin.read(1)[0] == 1 else Colour.BLUE
+                board = Board.from_bytes(stdin.read(board_bytes))
+            elif opcode == MOVE:
+                move = Move(x, y)
+        else:
+            line = stdin.readline().decode().strip()
+            if not line:
+                return
+            fields = line.split(";")
+            opcode = {"START": START, "MOVE": MOVE, "BOARD": BOARD}[fields[0]]
+            if opcode == BOARD:
+                board = Board.from_protocol_string(fields[1])
+                colour = Colour.from_char(fields[2])
+                turn, checksum = int(fields[3]), int(fields[4])
+            else:
+                if opcode == MOVE:
+                    move = Move(*map(int, fields[1].split(",")))
+                turn, checksum = int(fields[2]), int(fields[3])
+
+        if opcode == MOVE:
+            if move.x == -1 and move.y == -1:
+                colour = colour.opposite()
+                board.record_swap()
+            elif board.get_tile_colour(move.x, move.y) is None:
+                board.set_tile_colour(move.x, move.y, colour.opposite())
+
+        if board_checksum(board) != checksum:
+            reply = RESYNC
+        else:
+            reply = choose_move(board, colour, turn)
+            if reply.x == -1 and reply.y == -1:
+                colour = colour.opposite()
+                board.record_swap()
+            else:
+                board.set_tile_colour(reply.x, reply.y, colour)
+
+        if binary:
+            stdout.write(REPLY_FRAME.pack(reply.x, reply.y))
+        elif reply == RESYNC:
+            stdout.write(b"RESYNC\n")
+        else:
+            stdout.write(f"{reply.x},{reply.y}\n".encode())
+        stdout.flush()
@@ -1,4 +1,3 @@
-import copy
 import logging
 import os
 import sys
@@ -6,6 +5,7 @@ from time import perf_counter_ns as time
 from typing import TextIO
 
 from src.AgentBase import AgentBase
+from src.AgentProcess import AgentProcess
 from src.Board import Board
 from src.Colour import Colour
 from src.EndState import EndState
@@ -17,7 +17,7 @@ logging.basicConfig(format="[%(levelname)s]-%(asctime)s - %(message)s", level=lo
 
 
 def format_result(*, player1_name, player2_name, winner, win_method, player_1_move_time, player_2_move_time,
-                  player_1_turn, player_2_turn, total_turns, total_time) -> dict[str, str]:
+                  player_1_turn, player_2_turn, total_turns, total_time, swapped) -> dict[str, str]:
     return {
         "player1": player1_name,
         "player2": player2_name,
@@ -29,6 +29,7 @@ def format_result(*, player1_name, player2_name, winner, win_method, player_1_mo
         "player2_turns": player_2_turn,
         "total_turns": total_turns,
         "total_game_time": total_time,
+        "swapped": swapped,
     }
 
 
@@ -54,6 +55,8 @@ class Game:
         logDest: str | TextIO = sys.stderr,
         verbose: bool = False,
         silent: bool = False,
+        isolate_agents: bool = False,
+        ponder: bool = False,
     ):
         self._turn = 0  # current turn count
         self._board = Board(board_size)
@@ -67,6 +70,15 @@ class Game:
             Colour.RED: self.player1,
             Colour.BLUE: self.player2,
         }
+        if ponder and not isolate_agents:
+            # a pondering thread would compete with the opponent for the
+            # interpreter, on the opponent's clock
+            raise ValueError("Agents can only ponder when isolated in their own processes")
+        # run each agent in its own process, killed when its time runs out
+        self.isolate_agents = isolate_agents
+        self._agent_processes = {}
+        # let agents think on the opponent's time, see AgentBase.ponder
+        self.ponder = ponder
         # logger.setLevel(logging.DEBUG)
 
         if verbose:
@@ -94,12 +106,17 @@ class Game:
         try:
             assert issubclass(type(self.players[Colour.RED].agent), AgentBase)
             assert issubclass(type(self.players[Colour.BLUE].agent), AgentBase)
+            if self.isolate_agents:
+                for player in self.players.values():
+                    self._agent_processes[id(player)] = AgentProcess(player.agent, self.ponder)
             logger.info("Game started")
             return self._play()
         except Exception as e:
             self._end_game(None)
             print(f"Exception raised: {e}")
         finally:
+            for agentProcess in self._agent_processes.values():
+                agentProcess.close()
             if self.logDest != sys.stderr:
                 self.logDest.close()
 
@@ -126,17 +143,27 @@ class Game:
             logger.info(f"Starting Board:\n{str(self.board)}")
             currentPlayer.turn += 1
 
-            boardCopy = copy.deepcopy(self.board)
+            # the agent gets its own copy of the board; the engine's board is
+            # checked against its fingerprint afterwards
+            boardFingerprint = self.board.fingerprint
             turnCopy = self.turn
             # playerCopy = copy.deepcopy(self.players)
 
-            playerBoard = copy.deepcopy(self.board)
+            playerBoard = self.board.copy()
 
             start = time()
-            m = playerAgent.make_move(self.turn, playerBoard, opponentMove)
+            timedOut = False
+            if self.isolate_agents:
+                # stop waiting when the player's time runs out
+                timeLeft = max(Game.MAXIMUM_TIME - currentPlayer.move_time, 0) / 10**9
+                agentProcess = self._agent_processes[id(currentPlayer)]
+                m = agentProcess.make_move(self.turn, playerBoard, opponentMove, timeLeft)
+                timedOut = agentProcess.timed_out
+            else:
+                m = playerAgent.make_move(self.turn, playerBoard, opponentMove)
             end = time()
 
-            assert boardCopy == self.board, "Board was modified, Possible cheating!"
+            assert boardFingerprint == self.board.fingerprint, "Board was modified, Possible cheating!"
             assert turnCopy == self.turn, "Turn was modified, Possible cheating!"
             # assert playerCopy == self.players, "Players were modified, Possible cheating!"
             assert end > start, "Move time is negative, Possible cheating!"
@@ -144,7 +171,7 @@ class Game:
             currentPlayer.move_time += end - start
             logger.debug(f"Player {currentPlayer.name}; Move time: {currentPlayer.move_time}ns")
             logger.info(f"Player {currentPlayer.name}; Move: {self.current_player}{m}")
-            if currentPlayer.move_time > Game.MAXIMUM_TIME:
+            if timedOut or currentPlayer.move_time > Game.MAXIMUM_TIME:
                 logger.info(f"Player {currentPlayer.name} timed out")
                 endState = EndState.TIMEOUT
                 break
@@ -180,6 +207,7 @@ class Game:
 
             self.current_player = Colour.opposite(self.current_player)
             self.has_swapped = True
+            self.board.record_swap()
         else:
             self.board.set_tile_colour(m.x, m.y, self.current_player)
 
@@ -238,7 +266,8 @@ class Game:
             player_1_turn=self.player1.turn,
             player_2_turn=self.player2.turn,
             total_turns=self._turn,
-            total_time=Game.ns_to_s(total_time)
+            total_time=Game.ns_to_s(total_time),
+            swapped=self.has_swapped,
         )
 
     def is_valid_move(self, move: Move, turn: int, board: Board) -> bool:
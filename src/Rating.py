@@ -0,0 +1,218 @@
+import csv
+import sys
+from math import exp, log, sqrt
+
+# converts a rating in logits to Elo points
+ELO_PER_LOGIT = 400 / log(10)
+# z-score of a two sided 95% confidence interval
+Z_95 = 1.959963984540054
+
+
+class Rating:
+    """Bradley-Terry (Elo) ratings of the players of a tournament.
+
+    The probability that player1, who plays RED and moves first, wins a game
+    against player2 is modelled as
+
+        logistic(r1 - r2 + redAdvantage * (1 - swapped) - swapAdvantage * swapped)
+
+    so the first move advantage and the gain of a player who swaps are fitted
+    as separate effects. The fit maximises the likelihood of the results under
+    a weak Gaussian prior on every parameter, which keeps it finite when a
+    player has won or lost all of its games.
+
+    Results are aggregated into counts per (player1, player2, swapped), so
+    adding a result is cheap and each fit starts from the previous one, which
+    usually converges in one or two Newton steps.
+    """
+
+    def __init__(self, priorStrength: float = 0.01):
+        self.priorStrength = priorStrength
+        self.players = []
+        # (player1 index, player2 index, swapped) -> [player1 wins, games]
+        self._counts = {}
+        # players then redAdvantage then swapAdvantage, in logits
+        self._theta = [0.0, 0.0]
+        self._covariance = None
+
+    def add_result(self, result: dict):
+        """Adds the result of a game, a row of game_results_*.csv.
+
+        Games where an agent failed to load are ignored, as nothing was
+        played.
+        """
+
+        if result["win_method"] == "FAILED_LOAD":
+            return
+
+        player1 = self._player_index(result["player1"])
+        player2 = self._player_index(result["player2"])
+        # True from a journal, "True" from a csv
+        swapped = str(result.get("swapped")) == "True"
+        counts = self._counts.setdefault((player1, player2, swapped), [0, 0])
+        counts[0] += result["winner"] == result["player1"]
+        counts[1] += 1
+        self._covariance = None
+
+    def fit(self, tolerance: float = 1e-9, maxIterations: int = 100):
+        """Fits the parameters by Newton's method, starting from the last fit."""
+
+        theta = self._theta
+        posterior = self._log_posterior(theta)
+        for _ in range(maxIterations):
+            gradient, hessian = self._derivatives(theta)
+            step = _cholesky_solve(_cholesky(hessian), gradient)
+
+            # halve the step until it improves the posterior, Newton can overshoot
+            # when a player wins nearly all of its games
+            scale = 1.0
+            while True:
+                candidate = [t + scale * s for t, s in zip(theta, step)]
+                candidatePosterior = self._log_posterior(candidate)
+                if candidatePosterior >= posterior or scale < 1e-6:
+                    break
+                scale /= 2
+
+            theta, posterior = candidate, candidatePosterior
+            if max(abs(scale * s) for s in step) < tolerance:
+                break
+
+        self._theta = theta
+        self._covariance = _cholesky_inverse(_cholesky(self._derivatives(theta)[1]))
+
+    def ratings(self) -> dict[str, tuple[float, float]]:
+        """Returns the Elo rating of every player relative to the mean
+        player, with the half width of its 95% confidence interval.
+        """
+
+        if not self.players:
+            return {}
+
+        self._ensure_fit()
+        n = len(self.players)
+        theta, covariance = self._theta, self._covariance
+        mean = sum(theta[:n]) / n
+        columnMeans = [sum(covariance[i][j] for i in range(n)) / n for j in range(n)]
+        totalMean = sum(columnMeans) / n
+
+        ratings = {}
+        for i, player in enumerate(self.players):
+            # variance of r_i - mean(r)
+            variance = covariance[i][i] - 2 * columnMeans[i] + totalMean
+            ratings[player] = (
+                ELO_PER_LOGIT * (theta[i] - mean),
+                ELO_PER_LOGIT * Z_95 * sqrt(max(variance, 0.0)),
+            )
+        return ratings
+
+    def red_advantage(self) -> tuple[float, float]:
+        """Returns the Elo advantage of moving first when the second player
+        does not swap, with the half width of its 95% confidence interval.
+        """
+
+        return self._effect(len(self.players))
+
+    def swap_advantage(self) -> tuple[float, float]:
+        """Returns the Elo advantage of the player who swaps, with the half
+        width of its 95% confidence interval.
+        """
+
+        return self._effect(len(self.players) + 1)
+
+    def has_converged(self, maxWidth: float) -> bool:
+        """Returns True if the 95% confidence interval of every rating is
+        within maxWidth Elo points either side.
+        """
+
+        return bool(self.players) and all(width <= maxWidth for _, width in self.ratings().values())
+
+    def _effect(self, k: int) -> tuple[float, float]:
+        self._ensure_fit()
+        return ELO_PER_LOGIT * self._theta[k], ELO_PER_LOGIT * Z_95 * sqrt(self._covariance[k][k])
+
+    def _ensure_fit(self):
+        if self._covariance is None:
+            self.fit()
+
+    def _player_index(self, player: str) -> int:
+        try:
+            return self.players.index(player)
+        except ValueError:
+            self.players.append(player)
+            self._theta.insert(len(self.players) - 1, 0.0)
+            return len(self.players) - 1
+
+    def _features(self, player1: int, player2: int, swapped: bool) -> list[tuple[int, float]]:
+        n = len(self.players)
+        return [(player1, 1.0), (player2, -1.0), (n + 1, -1.0) if swapped else (n, 1.0)]
+
+    def _log_posterior(self, theta: list[float]) -> float:
+        total = -0.5 * self.priorStrength * sum(t * t for t in theta)
+        for key, (wins, games) in self._counts.items():
+            z = sum(theta[k] * x for k, x in self._features(*key))
+            # log(logistic(z)) and log(1 - logistic(z)) without overflow
+            logLoss = log(1 + exp(-abs(z)))
+            total += wins * (min(z, 0) - logLoss) + (games - wins) * (min(-z, 0) - logLoss)
+        return total
+
+    def _derivatives(self, theta: list[float]) -> tuple[list[float], list[list[float]]]:
+        """Returns the gradient of the log posterior and the negated Hessian."""
+
+        size = len(theta)
+        gradient = [-self.priorStrength * t for t in theta]
+        hessian = [[self.priorStrength if i == j else 0.0 for j in range(size)] for i in range(size)]
+        for key, (wins, games) in self._counts.items():
+            features = self._features(*key)
+            z = sum(theta[k] * x for k, x in features)
+            p = 1 / (1 + exp(-z)) if z >= 0 else exp(z) / (1 + exp(z))
+            weight = games * p * (1 - p)
+            for k, x in features:
+                gradient[k] += x * (wins - games * p)
+                for l, y in features:
+                    hessian[k][l] += weight * x * y
+        return gradient, hessian
+
+
+def _cholesky(matrix: list[list[float]]) -> list[list[float]]:
+    """Returns the lower triangular L with L L^T = matrix, which must be
+    symmetric positive definite.
+    """
+
+    n = len(matrix)
+    lower = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1):
+            s = matrix[i][j] - sum(lower[i][k] * lower[j][k] for k in range(j))
+            lower[i][j] = sqrt(s) if i == j else s / lower[j][j]
+    return lower
+
+
+def _cholesky_solve(lower: list[list[float]], b: list[float]) -> list[float]:
+    n = len(lower)
+    y = [0.0] * n
+    for i in range(n):
+        y[i] = (b[i] - sum(lower[i][k] * y[k] for k in range(i))) / lower[i][i]
+    x = [0.0] * n
+    for i in reversed(range(n)):
+        x[i] = (y[i] - sum(lower[k][i] * x[k] for k in range(i + 1, n))) / lower[i][i]
+    return x
+
+
+def _cholesky_inverse(lower: list[list[float]]) -> list[list[float]]:
+    n = len(lower)
+    columns = [_cholesky_solve(lower, [1.0 if i == j else 0.0 for i in range(n)]) for j in range(n)]
+    return [[columns[j][i] for j in range(n)] for i in range(n)]
+
+
+if __name__ == "__main__":
+    # rates the players of the given game_results_*.csv files
+    rating = Rating()
+    for path in sys.argv[1:]:
+        with open(path, newline="") as csvFile:
+            for result in csv.DictReader(csvFile):
+                rating.add_result(result)
+
+    for player, (elo, width) in sorted(rating.ratings().items(), key=lambda item: -item[1][0]):
+        print(f"{player}: {elo:.0f} +/- {width:.0f}")
+    print("red advantage: {:.0f} +/- {:.0f}".format(*rating.red_advantage()))
+    print("swap advantage: {:.0f} +/- {:.0f}".format(*rating.swap_advantage()))
@@ -0,0 +1,75 @@
+from math import log
+
+from src.Rating import ELO_PER_LOGIT
+
+
+def elo_to_score(elo: float) -> float:
+    """Returns the expected score of a player who is elo points stronger."""
+
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+class SPRT:
+    """Sequential probability ratio test of whether player A is elo1 rather
+    than elo0 Elo points stronger than player B.
+
+    Hex has no draws, so each game is a Bernoulli trial won by A with
+    probability elo_to_score(elo). Games are assumed to alternate colours,
+    which cancels out the first move advantage on average; the test treats
+    the games as independent, which is conservative when colour matters.
+    """
+
+    def __init__(self, elo0: float = 0, elo1: float = 10, alpha: float = 0.05, beta: float = 0.05):
+        if elo0 >= elo1:
+            raise ValueError("elo1 must be greater than elo0")
+
+        self.elo0 = elo0
+        self.elo1 = elo1
+        score0 = elo_to_score(elo0)
+        score1 = elo_to_score(elo1)
+        # log likelihood ratio added by a win and by a loss of A
+        self._winRatio = log(score1 / score0)
+        self._lossRatio = log((1 - score1) / (1 - score0))
+        # accept H0 (elo0) at or below lower, H1 (elo1) at or above upper
+        self.lower = log(beta / (1 - alpha))
+        self.upper = log((1 - beta) / alpha)
+        self.wins = 0
+        self.losses = 0
+
+    def add_game(self, won: bool):
+        if won:
+            self.wins += 1
+        else:
+            self.losses += 1
+
+    @property
+    def llr(self) -> float:
+        return self.wins * self._winRatio + self.losses * self._lossRatio
+
+    def status(self) -> str:
+        """Returns "H1" if A is shown to be elo1 stronger, "H0" if it is shown
+        to be at most elo0 stronger, or "" while the test is undecided.
+        """
+
+        llr = self.llr
+        if llr >= self.upper:
+            return "H1"
+        if llr <= self.lower:
+            return "H0"
+        return ""
+
+    def elo(self) -> float:
+        """Returns the Elo difference measured so far."""
+
+        games = self.wins + self.losses
+        if games == 0:
+            return 0.0
+        # half a game on either side keeps the estimate finite
+        score = (self.wins + 0.5) / (games + 1)
+        return ELO_PER_LOGIT * log(score / (1 - score))
+
+    def __str__(self) -> str:
+        return (
+            f"LLR {self.llr:.2f} ({self.lower:.2f}, {self.upper:.2f}) [{self.elo0}, {self.elo1}] "
+            f"+{self.wins} -{self.losses} elo {self.elo():.1f}"
+        )
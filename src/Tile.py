@@ -1,11 +1,16 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from src.Colour import Colour
 
 
-@dataclass
+@dataclass(eq=False)
 class Tile:
-    """The class representation of a tile on a board of Hex."""
+    """The class representation of a tile on a board of Hex.
+
+    Tiles handed out by a Board are views: their colour is read from and
+    written to the board's bitboards. Tiles are equal when they have the
+    same position and colour, wherever the colour is kept.
+    """
 
     # number of neighbours a tile has
     NEIGHBOUR_COUNT = 6
@@ -18,6 +23,16 @@ class Tile:
     _y: int
     _colour: Colour = None
     _visited: bool = False
+    _board: "Board" = field(default=None, repr=False)
+
+    def __eq__(self, value: object) -> bool:
+        if not isinstance(value, Tile):
+            return False
+
+        return (self._x, self._y, self.colour) == (value._x, value._y, value.colour)
+
+    def __hash__(self) -> int:
+        return hash((self._x, self._y, self.colour))
 
     @property
     def x(self):
@@ -29,11 +44,16 @@ class Tile:
 
     @property
     def colour(self):
+        if self._board is not None:
+            return self._board.get_tile_colour(self._x, self._y)
         return self._colour
 
     @colour.setter
     def colour(self, colour):
-        self._colour = colour
+        if self._board is not None:
+            self._board.set_tile_colour(self._x, self._y, colour)
+        else:
+            self._colour = colour
 
     def visit(self):
         self._visited = True
@@ -1,9 +1,11 @@
 import unittest
+from threading import Event
+from time import time
 
 from src.Board import Board
 from src.Colour import Colour
 from src.Move import Move
-from agents.Group17.GoodAgent import GoodAgent
+from agents.Group17.GoodAgent import BatchPlayout, GoodAgent
 
 class TestAgent(unittest.TestCase):
     def test_get_neighbours_middle(self):
@@ -80,5 +82,188 @@ class TestAgent(unittest.TestCase):
         actual_move = agent.make_move(57, board, Move(3,1))
         self.assertIn(actual_move, expected_moves)
 
+    def test_tree_reused_after_opponent_move(self):
+        agent = GoodAgent(Colour.RED)
+        agent._max_iterations = 300
+        agent._time_limit = 0.2
+        board = Board(11)
+        board.set_tile_colour(5, 5, Colour.RED)
+        agent._choices.remove((5, 5))
+
+        # search on the opponent's time, then follow its reply
+        agent.ponder(board, Event())
+        tree = agent._tree
+        reply = max(tree.children(agent._root), key=lambda child: tree.visits[child])
+        visits = tree.visits[reply]
+        action = divmod(tree.move[reply], 11)
+        agent._choices.remove(action)
+        agent.advance_tree(action)
+        self.assertEqual(agent._root, reply)
+        self.assertGreater(visits, 0)
+
+        state = [[tile.colour for tile in row] for row in board.tiles]
+        state[action[0]][action[1]] = Colour.BLUE
+        move = agent.mcts(state, time())
+        self.assertEqual(agent._root, reply)
+        self.assertGreater(tree.visits[reply], visits)
+        agent.end_turn(move)
+        self.assertIn(agent._root, list(tree.children(reply)) + [-1])
+
+    def test_rave_statistics_carried_to_next_turn(self):
+        agent = GoodAgent(Colour.RED)
+        agent._max_iterations = 300
+        state = [[None] * 11 for _ in range(11)]
+        move = agent.mcts(state, time())
+        tree = agent._tree
+        root = agent._root
+        amaf = {tree.move[child]: tree.amaf_visits[child] for child in tree.children(root)}
+        agent.end_turn(move)
+        prior = agent._rave_prior
+        self.assertEqual(prior[0][0], int(amaf[0] * agent.RAVE_CARRY))
+        self.assertGreater(sum(visits for visits, _ in prior.values()), 300)
+
+        # the statistics reach the next root's children even when the tree is not kept
+        state[move[0]][move[1]] = Colour.RED
+        reply = next(tile for tile in [(0, 0), (0, 1)] if tile != move)
+        state[reply[0]][reply[1]] = Colour.BLUE
+        agent._choices.remove(reply)
+        agent.advance_tree(reply)
+        agent._root = -1
+        agent.mcts(state, time())
+        for child in tree.children(agent._root):
+            self.assertGreaterEqual(tree.amaf_visits[child], prior[tree.move[child]][0])
+
+    def test_tree_dropped_when_state_differs(self):
+        agent = GoodAgent(Colour.RED)
+        agent._max_iterations = 50
+        agent.ponder(Board(11), Event())
+        self.assertGreaterEqual(agent._root, 0)
+        agent.advance_tree((10, 10))
+        agent.advance_tree((0, 0))
+        self.assertEqual(agent._root, -1)
+
+    def test_transposed_moves_share_statistics(self):
+        agent = GoodAgent(Colour.RED)
+        state = [[None] * 11 for _ in range(11)]
+        root = agent.set_root(state, True)
+        tree = agent._tree
+        # (0, 0), (0, 1), (0, 2) reaches the same state as (0, 2), (0, 1), (0, 0)
+        leaves = []
+        for order in [(0, 1, 2), (2, 1, 0)]:
+            node = root
+            our_turn = True
+            for move in order:
+                node = tree.add_child(node, move, agent.child_key(node, move, our_turn))
+                our_turn = not our_turn
+            leaves.append(node)
+        self.assertEqual(tree.share[leaves[1]], leaves[0])
+        self.assertNotEqual(tree.share[tree.parent[leaves[1]]], tree.parent[leaves[0]])
+
+        state[0][0] = state[0][2] = Colour.RED
+        state[0][1] = Colour.BLUE
+        self.assertEqual(tree.key[leaves[0]], agent.state_key(state))
+
+    def test_backpropagation_updates_rave(self):
+        agent = GoodAgent(Colour.RED)
+        state = [[None] * 11 for _ in range(11)]
+        root = agent.set_root(state, True)
+        tree = agent._tree
+        children = {move: tree.add_child(root, move) for move in (0, 1, 2)}
+        leaf = tree.add_child(children[0], 3)
+
+        # red played 0 and 1 and won, blue played 2 and 3
+        state[0][0] = state[0][1] = Colour.RED
+        state[0][2] = state[0][3] = Colour.BLUE
+        agent.backpropagation([root, children[0], leaf], True, True, state)
+        self.assertEqual([(tree.amaf_visits[children[move]], tree.amaf_value[children[move]]) for move in (0, 1, 2)],
+                         [(1, 1), (1, 1), (0, 0)])
+        # blue was to move after red's 0 and played 3, but lost
+        self.assertEqual((tree.amaf_visits[leaf], tree.amaf_value[leaf]), (1, 0))
+        self.assertEqual((tree.visits[children[0]], tree.value[children[0]]), (1, 1))
+
+    def test_mcts_iterates_search_step(self):
+        agent = GoodAgent(Colour.RED)
+        agent._max_iterations = 30
+        search_step = agent.search_step
+        timings = []
+        agent.search_step = lambda root: timings.append(search_step(root)) or timings[-1]
+        state = [[None] * 11 for _ in range(11)]
+        x, y = agent.mcts(state, time())
+        self.assertEqual(len(timings), 30)
+        self.assertTrue(all(len(phases) == 4 and min(phases) >= 0 for phases in timings))
+        self.assertEqual(agent._tree.visits[agent._tree.share[agent._root]], 30)
+        self.assertIsNone(state[x][y])
+
+    def test_expansion_tries_each_move_once(self):
+        agent = GoodAgent(Colour.RED)
+        state = [[None] * 11 for _ in range(11)]
+        state[5][5] = Colour.RED
+        root = agent.set_root(state, False)
+        tree = agent._tree
+        # a move already tried when the node is first expanded is left out
+        tree.add_child(root, 0)
+        children = [agent.expansion(root, state, False) for _ in range(119)]
+        self.assertEqual(agent.expansion(root, state, False), -1)
+        self.assertEqual(sorted(tree.move[child] for child in children), list(range(1, 60)) + list(range(61, 121)))
+        self.assertEqual(tree.untried[root], [])
+
+    def test_root_parallel_search(self):
+        agent = GoodAgent(Colour.RED)
+        agent._search_workers = 3
+        agent._max_iterations = 100
+        state = [[None] * 11 for _ in range(11)]
+        root = agent.set_root(state, True)
+        for _ in range(50):
+            agent.search_step(root)
+
+        # every iteration of a worker adds one visit below the root
+        baseline = agent.root_statistics(root)
+        workers = agent.fork_workers(root, time())
+        statistics = dict(baseline)
+        agent.collect_workers(workers, time(), baseline, statistics)
+        self.assertEqual(sum(visits for visits, _ in statistics.values()), 50 + 2 * 100)
+        self.assertEqual(agent.root_statistics(root), baseline)
+
+        move = agent.mcts(state, time())
+        self.assertIsNone(state[move[0]][move[1]])
+
+    def test_batch_backpropagation_of_one_simulation(self):
+        agents = [GoodAgent(Colour.RED), GoodAgent(Colour.RED)]
+        state = [[None] * 11 for _ in range(11)]
+        state[0][0] = state[0][1] = Colour.RED
+        state[0][2] = state[0][3] = Colour.BLUE
+        cells = [tile for row in state for tile in row]
+        amaf = {
+            colour: ([int(tile == colour) for tile in cells], [int(tile == colour and colour == Colour.RED) for tile in cells])
+            for colour in (Colour.RED, Colour.BLUE)
+        }
+        for batch, agent in enumerate(agents):
+            root = agent.set_root([[None] * 11 for _ in range(11)], True)
+            children = [agent._tree.add_child(root, move) for move in (0, 1, 2)]
+            path = [root, children[0], agent._tree.add_child(children[0], 3)]
+            if batch:
+                agent.batch_backpropagation(path, True, 1, 1, amaf)
+            else:
+                agent.backpropagation(path, True, True, state)
+        trees = [agent._tree for agent in agents]
+        for field in ("visits", "value", "amaf_visits", "amaf_value"):
+            self.assertEqual(getattr(trees[0], field)[:5], getattr(trees[1], field)[:5])
+
+    @unittest.skipIf(BatchPlayout is None, "numpy is not installed")
+    def test_workers_reseed_batch_playouts(self):
+        class BatchAgent(GoodAgent):
+            _playouts_per_leaf = 8
+            _search_workers = 3
+            _max_iterations = 1
+
+        agent = BatchAgent(Colour.RED)
+        # each worker reports the first number its batch generator draws
+        agent.search_step = lambda root: None
+        agent.root_statistics = lambda root: {int(agent._batch.rng.integers(1 << 30)): (1, 0)}
+        statistics = {}
+        agent.collect_workers(agent.fork_workers(-1, time()), time(), {}, statistics)
+        self.assertEqual(len(statistics), 2)
+
+
 if __name__ == "__main__":
     unittest.main()
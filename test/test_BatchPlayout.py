@@ -0,0 +1,45 @@
+import random
+import unittest
+
+from src.Board import Board
+from src.Colour import Colour
+
+try:
+    from agents.Group17.BatchPlayout import BLUE, RED, BatchPlayout
+except ImportError:
+    BatchPlayout = None
+
+
+@unittest.skipIf(BatchPlayout is None, "numpy is not installed")
+class TestBatchPlayout(unittest.TestCase):
+    def test_fills_the_empty_tiles(self):
+        state = [[None] * 11 for _ in range(11)]
+        state[5][5] = Colour.RED
+        state[4][6] = Colour.BLUE
+        state[0][0] = Colour.BLUE
+        _, boards = BatchPlayout().play(state, Colour.RED, 20)
+        self.assertEqual(boards.shape, (20, 11, 11))
+        self.assertTrue((boards[:, 5, 5] == RED).all())
+        self.assertTrue((boards[:, 0, 0] == BLUE).all())
+        # red moves first among the 118 empty tiles, so each colour plays 59 of them
+        self.assertTrue(((boards == RED).sum(axis=(1, 2)) == 60).all())
+        self.assertTrue(((boards == BLUE).sum(axis=(1, 2)) == 61).all())
+        self.assertGreater(len({board.tobytes() for board in boards}), 1)
+
+    def test_winners_agree_with_the_board(self):
+        random.seed(1)
+        for size in (3, 11):
+            state = [[None] * size for _ in range(size)]
+            red_wins, boards = BatchPlayout(size).play(state, Colour.BLUE, 50)
+            for won, stones in zip(red_wins, boards):
+                board = Board(size)
+                for x in range(size):
+                    for y in range(size):
+                        board.set_tile_colour(x, y, Colour.RED if stones[x, y] == RED else Colour.BLUE)
+                self.assertEqual(board.has_ended(Colour.RED), bool(won))
+                # a full board always has a winner
+                self.assertTrue(board.has_ended(Colour.BLUE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,9 @@
+import random
 import unittest
 
-from src.Board import Board
+from src.Board import Board, splitmix64
 from src.Colour import Colour
+from src.Tile import Tile
 
 # NOTE: LLM generated tests not checked by human
 
@@ -37,6 +39,37 @@ class TestBoard(unittest.TestCase):
         self.assertTrue(self.board.has_ended(Colour.BLUE))
         self.assertEqual(self.board.get_winner(), Colour.BLUE)
 
+    def test_has_ended_not_connected(self):
+        for i in range(10):
+            self.board.set_tile_colour(i, 0, Colour.RED)
+        self.assertFalse(self.board.has_ended(Colour.RED))
+        self.assertFalse(self.board.has_ended(Colour.BLUE))
+        self.assertIsNone(self.board.get_winner())
+
+    def test_has_ended_winding_chain(self):
+        board = Board(19)
+        # snake down the board, alternating between the left and right sides
+        for i in range(19):
+            if i % 4 in (0, 2):
+                board.set_tile_colour(i, 0 if i % 4 == 0 else 18, Colour.RED)
+            else:
+                for j in range(19):
+                    board.set_tile_colour(i, j, Colour.RED)
+        self.assertTrue(board.has_ended(Colour.RED))
+        self.assertEqual(board.get_winner(), Colour.RED)
+
+    def test_has_ended_after_overwrite(self):
+        for i in range(11):
+            self.board.set_tile_colour(i, 0, Colour.RED)
+        self.board.set_tile_colour(5, 0, Colour.BLUE)
+        self.assertFalse(self.board.has_ended(Colour.RED))
+        self.board.set_tile_colour(5, 0, Colour.RED)
+        self.assertTrue(self.board.has_ended(Colour.RED))
+
+    def test_has_ended_invalid_colour(self):
+        with self.assertRaises(ValueError):
+            self.board.has_ended(None)
+
     def test_board_equality(self):
         board1 = Board(5)
         board2 = Board(5)
@@ -44,6 +77,176 @@ class TestBoard(unittest.TestCase):
         board1.set_tile_colour(0, 0, Colour.RED)
         self.assertNotEqual(board1, board2)
 
+        self.assertEqual(hash(board1), hash(board1.copy()))
+
+    def test_tile_view_writes_through(self):
+        self.board.tiles[2][3].colour = Colour.BLUE
+        self.assertEqual(self.board.get_tile_colour(2, 3), Colour.BLUE)
+        self.assertEqual(self.board.stones(Colour.BLUE), 1 << (2 * 11 + 3))
+
+    def test_tile_views_compare_colours(self):
+        other = Board(11)
+        self.board.set_tile_colour(0, 0, Colour.RED)
+        self.assertNotEqual(self.board.tiles[0][0], other.tiles[0][0])
+        other.set_tile_colour(0, 0, Colour.RED)
+        self.assertEqual(self.board.tiles[0][0], other.tiles[0][0])
+        self.assertEqual(hash(self.board.tiles[0][0]), hash(other.tiles[0][0]))
+        self.assertEqual(self.board.tiles[0][0], Tile(0, 0, Colour.RED))
+        self.assertNotEqual(self.board.tiles[0][0], self.board.tiles[0][1])
+
+    def test_copy_is_independent(self):
+        self.board.set_tile_colour(0, 0, Colour.RED)
+        board_copy = self.board.copy()
+        board_copy.set_tile_colour(1, 1, Colour.BLUE)
+        self.assertIsNone(self.board.tiles[1][1].colour)
+        self.assertEqual(board_copy.tiles[0][0].colour, Colour.RED)
+
+    def test_neighbours(self):
+        def bit(x, y):
+            return 1 << (x * 11 + y)
+
+        expected = bit(3, 4) | bit(3, 5) | bit(4, 5) | bit(5, 4) | bit(5, 3) | bit(4, 3)
+        self.assertEqual(self.board.neighbours(bit(4, 4)), expected)
+        self.assertEqual(self.board.neighbours(bit(4, 0)), bit(3, 0) | bit(3, 1) | bit(4, 1) | bit(5, 0))
+        self.assertEqual(self.board.neighbours(bit(10, 10)), bit(9, 10) | bit(10, 9))
+
+    def test_zobrist_hash_transposition(self):
+        board1 = Board(11)
+        board1.set_tile_colour(1, 2, Colour.RED)
+        board1.set_tile_colour(3, 4, Colour.BLUE)
+        board2 = Board(11)
+        board2.set_tile_colour(3, 4, Colour.BLUE)
+        board2.set_tile_colour(1, 2, Colour.RED)
+        self.assertEqual(board1.zobrist_hash, board2.zobrist_hash)
+        self.assertNotEqual(board1.zobrist_hash, self.board.zobrist_hash)
+
+    def test_zobrist_hash_reverts(self):
+        empty_hash = self.board.zobrist_hash
+        self.board.set_tile_colour(1, 2, Colour.RED)
+        self.board.set_tile_colour(1, 2, Colour.BLUE)
+        self.board.set_tile_colour(1, 2, None)
+        self.assertEqual(self.board.zobrist_hash, empty_hash)
+
+    def test_zobrist_hash_swap(self):
+        board = Board(11)
+        board.set_tile_colour(5, 5, Colour.RED)
+        unswapped_hash = board.zobrist_hash
+        board.record_swap()
+        self.assertTrue(board.swapped)
+        self.assertNotEqual(board.zobrist_hash, unswapped_hash)
+        self.assertEqual(board.copy().zobrist_hash, board.zobrist_hash)
+
+    def test_zobrist_keys_documented(self):
+        board = Board(11)
+        board.set_tile_colour(1, 2, Colour.RED)
+        board.set_tile_colour(3, 4, Colour.BLUE)
+        board.record_swap()
+        self.assertEqual(board.zobrist_hash, splitmix64(2 * 13) ^ splitmix64(2 * 37 + 1) ^ splitmix64(2 * 121))
+        # the first output of SplitMix64 seeded with 0
+        self.assertEqual(splitmix64(0), 0xE220A8397B1DCDAF)
+
+    def test_play_undo_restores_board(self):
+        self.board.set_tile_colour(5, 5, Colour.RED)
+        fingerprint = self.board.fingerprint
+        zobrist_hash = self.board.zobrist_hash
+
+        cells = [(i, j) for i in range(11) for j in range(11) if (i, j) != (5, 5)]
+        random.Random(0).shuffle(cells)
+        for turn, (x, y) in enumerate(cells):
+            self.board.play(x, y, Colour.RED if turn % 2 else Colour.BLUE)
+        self.assertTrue(self.board.has_ended(Colour.RED) or self.board.has_ended(Colour.BLUE))
+
+        for _ in cells:
+            self.board.undo()
+        self.assertEqual(self.board.fingerprint, fingerprint)
+        self.assertEqual(self.board.zobrist_hash, zobrist_hash)
+        self.assertIsNone(self.board.get_winner())
+        with self.assertRaises(IndexError):
+            self.board.undo()
+
+    def test_play_undo_win_detection(self):
+        for i in range(10):
+            self.board.play(i, 3, Colour.RED)
+        self.board.play(10, 3, Colour.RED)
+        self.assertTrue(self.board.has_ended(Colour.RED))
+        self.board.undo()
+        self.assertFalse(self.board.has_ended(Colour.RED))
+        self.board.play(10, 2, Colour.RED)
+        self.assertTrue(self.board.has_ended(Colour.RED))
+
+    def test_play_occupied_tile(self):
+        self.board.play(0, 0, Colour.RED)
+        with self.assertRaises(ValueError):
+            self.board.play(0, 0, Colour.BLUE)
+
+    def test_is_connected_large_snake(self):
+        board = Board(32)
+        # a single chain winding across the whole board, longer than the recursion limit
+        for i in range(0, 32, 2):
+            for j in range(32):
+                board.set_tile_colour(i, j, Colour.RED)
+            if i + 1 < 32:
+                board.set_tile_colour(i + 1, 31 if i % 4 == 0 else 0, Colour.RED)
+        self.assertTrue(board.is_connected(Colour.RED))
+        self.assertFalse(board.is_connected(Colour.BLUE))
+        self.assertTrue(board.has_ended(Colour.RED))
+
+    def test_is_connected_matches_has_ended(self):
+        rng = random.Random(1)
+        for _ in range(20):
+            board = Board(7)
+            for i in range(7):
+                for j in range(7):
+                    board.set_tile_colour(i, j, rng.choice([Colour.RED, Colour.BLUE, None]))
+            for colour in Colour:
+                expected = board.is_connected(colour)
+                self.assertEqual(board.copy().has_ended(colour), expected)
+
+    def test_flood(self):
+        self.board.set_tile_colour(0, 0, Colour.BLUE)
+        self.board.set_tile_colour(0, 1, Colour.BLUE)
+        self.board.set_tile_colour(2, 2, Colour.BLUE)
+        self.assertEqual(self.board.flood(1, Colour.BLUE), 0b11)
+
+    def test_protocol_string_round_trip(self):
+        protocol_string = "R0B,0R0,B00"
+        board = Board.from_protocol_string(protocol_string)
+        self.assertEqual(board.size, 3)
+        self.assertEqual(board.tiles[0][2].colour, Colour.BLUE)
+        self.assertEqual(board.tiles[1][1].colour, Colour.RED)
+        self.assertEqual(board.to_protocol_string(), protocol_string)
+        self.assertEqual(Board(2).to_protocol_string(), "00,00")
+
+    def test_from_protocol_string_invalid(self):
+        with self.assertRaises(ValueError):
+            Board.from_protocol_string("R0X,000,000")
+        with self.assertRaises(ValueError):
+            Board.from_protocol_string("R0,000")
+
+    def test_bytes_round_trip(self):
+        rng = random.Random(2)
+        for size in (1, 5, 11, 19):
+            board = Board(size)
+            for i in range(size):
+                for j in range(size):
+                    board.set_tile_colour(i, j, rng.choice([Colour.RED, Colour.BLUE, None]))
+            board.record_swap()
+            data = board.to_bytes()
+            self.assertEqual(len(data), 2 + (size * size + 3) // 4)
+
+            loaded = Board.from_bytes(memoryview(bytearray(data)))
+            self.assertEqual(loaded, board)
+            self.assertEqual(loaded.zobrist_hash, board.zobrist_hash)
+            self.assertEqual(loaded.copy().has_ended(Colour.RED), board.is_connected(Colour.RED))
+
+    def test_bytes_layout(self):
+        board = Board(2)
+        board.set_tile_colour(0, 1, Colour.RED)
+        board.set_tile_colour(1, 0, Colour.BLUE)
+        self.assertEqual(board.to_bytes(), bytes([2, 0, 0b00100100]))
+        with self.assertRaises(ValueError):
+            Board.from_bytes(bytes([2, 0, 0b00000011]))
+
 
 if __name__ == "__main__":
     unittest.main()
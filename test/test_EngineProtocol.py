@@ -0,0 +1,114 @@
+import sys
+import unittest
+
+from src.Board import Board
+from src.Colour import Colour
+from src.EngineProtocol import EngineConnection, board_checksum
+from src.Move import Move
+
+# a version 2 engine that plays the first empty tile, swapping on turn 2
+ENGINE = """
+from src.EngineProtocol import serve_engine
+from src.Move import Move
+
+def choose_move(board, colour, turn):
+    if turn == 2:
+        return Move(-1, -1)
+    empty = board.empty()
+    tile = (empty & -empty).bit_length() - 1
+    return Move(tile // board.size, tile % board.size)
+
+serve_engine(choose_move)
+"""
+
+# a version 1 engine that plays the first empty tile of the board it is sent
+LEGACY_ENGINE = """
+import sys
+for line in sys.stdin:
+    cells = line.split(";")[2].replace(",", "")
+    tile = cells.index("0")
+    print(f"{tile // 11},{tile % 11}", flush=True)
+"""
+
+
+class TestEngineProtocol(unittest.TestCase):
+    def play(self, engine: EngineConnection, colour: Colour, opponentMoves: list[Move | None]) -> list[Move]:
+        """Plays the engine against the given moves, as the game would."""
+
+        board = Board(11)
+        turn = 1
+        moves = []
+        for opp_move in opponentMoves:
+            if opp_move is not None:
+                if opp_move.x == -1:
+                    board.record_swap()
+                    colour = colour.opposite()
+                else:
+                    board.set_tile_colour(opp_move.x, opp_move.y, colour.opposite())
+                turn += 1
+
+            move = engine.request_move(turn, board.copy(), opp_move, colour)
+            if move.x == -1:
+                board.record_swap()
+                colour = colour.opposite()
+            else:
+                self.assertIsNone(board.get_tile_colour(move.x, move.y))
+                board.set_tile_colour(move.x, move.y, colour)
+            moves.append(move)
+            turn += 1
+        return moves
+
+    def test_text_protocol(self):
+        engine = EngineConnection([sys.executable, "-c", ENGINE], Colour.RED, version=2)
+        moves = self.play(engine, Colour.RED, [None, Move(-1, -1), Move(5, 5)])
+        engine.close()
+        self.assertEqual(moves, [Move(0, 0), Move(0, 1), Move(0, 2)])
+
+    def test_binary_protocol(self):
+        engine = EngineConnection([sys.executable, "-c", ENGINE], Colour.BLUE, version=2, binary=True)
+        moves = self.play(engine, Colour.BLUE, [Move(3, 3), Move(0, 1), Move(7, 7)])
+        engine.close()
+        self.assertEqual(moves, [Move(-1, -1), Move(0, 0), Move(0, 2)])
+
+    def test_resends_board_that_does_not_follow(self):
+        for binary in [False, True]:
+            engine = EngineConnection([sys.executable, "-c", ENGINE], Colour.RED, version=2, binary=binary)
+            board = Board(11)
+            board.set_tile_colour(0, 0, Colour.BLUE)
+            board.set_tile_colour(0, 1, Colour.RED)
+            self.assertEqual(engine.request_move(3, board, Move(0, 0), Colour.RED), Move(0, 2))
+            engine.close()
+
+    def test_engine_requests_resync(self):
+        engine = EngineConnection([sys.executable, "-c", ENGINE], Colour.RED, version=2)
+        self.assertEqual(engine.request_move(1, Board(11), None, Colour.RED), Move(0, 0))
+
+        # the engine believes it played (0, 0), but the connection is told otherwise
+        engine._board.set_tile_colour(0, 0, None)
+        engine._board.set_tile_colour(0, 1, Colour.RED)
+        board = Board(11)
+        board.set_tile_colour(0, 1, Colour.RED)
+        board.set_tile_colour(4, 4, Colour.BLUE)
+        self.assertEqual(engine.request_move(3, board, Move(4, 4), Colour.RED), Move(0, 0))
+        engine.close()
+
+    def test_legacy_protocol(self):
+        engine = EngineConnection([sys.executable, "-c", LEGACY_ENGINE], Colour.RED)
+        moves = self.play(engine, Colour.RED, [None, Move(0, 1), Move(5, 5)])
+        engine.close()
+        self.assertEqual(moves, [Move(0, 0), Move(0, 2), Move(0, 3)])
+
+    def test_engine_without_version_2(self):
+        self.assertRaises(ConnectionError, EngineConnection, [sys.executable, "-c", LEGACY_ENGINE], Colour.RED, version=2)
+
+    def test_board_checksum(self):
+        board = Board(11)
+        empty = board_checksum(board)
+        board.set_tile_colour(2, 3, Colour.RED)
+        self.assertNotEqual(board_checksum(board), empty)
+        self.assertEqual(board_checksum(Board.from_protocol_string(board.to_protocol_string())), board_checksum(board))
+        self.assertEqual(board_checksum(board), board.zobrist_hash)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import Mock, patch
 
+from src.AgentBase import AgentBase
 from src.Board import Board
 from src.Colour import Colour
 from src.EndState import EndState
@@ -10,6 +11,62 @@ from src.Player import Player
 
 # NOTE: LLM generated tests not checked by human
 
+
+class FirstEmptyAgent(AgentBase):
+    """Plays the first empty tile."""
+
+    def __init__(self, colour):
+        super().__init__(colour)
+
+    def make_move(self, turn, board, opp_move):
+        empty = board.empty()
+        tile = (empty & -empty).bit_length() - 1
+        return Move(tile // board.size, tile % board.size)
+
+
+class PonderingAgent(FirstEmptyAgent):
+    """Plays an illegal move unless it pondered on the board before the
+    opponent's last move, and was stopped before being asked to move.
+    """
+
+    def __init__(self, colour):
+        super().__init__(colour)
+        self.ponderBoard = None
+        self.stopped = False
+
+    def ponder(self, board, stop_event):
+        self.ponderBoard = board
+        self.stopped = False
+        stop_event.wait()
+        self.stopped = True
+
+    def make_move(self, turn, board, opp_move):
+        if turn > 2:
+            stones = bin(board.stones(Colour.RED) | board.stones(Colour.BLUE)).count("1")
+            pondered = bin(self.ponderBoard.stones(Colour.RED) | self.ponderBoard.stones(Colour.BLUE)).count("1")
+            if not self.stopped or stones != pondered + 1:
+                return Move(-2, -2)
+        return super().make_move(turn, board, opp_move)
+
+
+class NoMoveAgent(FirstEmptyAgent):
+    """Returns no move on its third move."""
+
+    def make_move(self, turn, board, opp_move):
+        if turn > 2:
+            return None
+        return super().make_move(turn, board, opp_move)
+
+
+class HangingAgent(FirstEmptyAgent):
+    """Never returns from its third move."""
+
+    def make_move(self, turn, board, opp_move):
+        while turn > 2:
+            pass
+        return super().make_move(turn, board, opp_move)
+
+
 class TestGame(unittest.TestCase):
     def setUp(self):
         self.player1 = Player("Player1", Mock())
@@ -39,6 +96,55 @@ class TestGame(unittest.TestCase):
         self.assertEqual(result["player2_move_time"], 380)
         self.assertEqual(result["total_game_time"], 500)
 
+    def test_play_agent_board_is_a_copy(self):
+        def scribble(turn, board, opp_move):
+            board.set_tile_colour(5, 5, Colour.BLUE)
+            return Move(0, 0)
+
+        self.player1.agent.make_move.side_effect = scribble
+        self.player2.agent.make_move.return_value = Move(1, 1)
+        result = self.game._play()
+
+        # player1 repeats its move on turn 3
+        self.assertEqual(result["winner"], "Player2")
+        self.assertEqual(result["win_method"], "BAD_MOVE")
+        self.assertIsNone(self.board.tiles[5][5].colour)
+
+    def test_isolated_agents_play(self):
+        game = Game(Player("Player1", FirstEmptyAgent(Colour.RED)), Player("Player2", FirstEmptyAgent(Colour.BLUE)),
+                    silent=True, isolate_agents=True)
+        result = game.run()
+        self.assertEqual(result["win_method"], "WIN")
+        self.assertEqual(game._agent_processes[id(game.player1)].pid, None)
+
+    def test_ponder(self):
+        game = Game(Player("Player1", PonderingAgent(Colour.RED)), Player("Player2", PonderingAgent(Colour.BLUE)),
+                    silent=True, isolate_agents=True, ponder=True)
+        result = game.run()
+        self.assertEqual(result["win_method"], "WIN")
+
+    def test_ponder_requires_isolation(self):
+        with self.assertRaises(ValueError):
+            Game(Player("Player1", PonderingAgent(Colour.RED)), Player("Player2", PonderingAgent(Colour.BLUE)),
+                 silent=True, ponder=True)
+
+    def test_no_move_is_a_bad_move(self):
+        for isolate in (False, True):
+            game = Game(Player("Player1", NoMoveAgent(Colour.RED)), Player("Player2", FirstEmptyAgent(Colour.BLUE)),
+                        silent=True, isolate_agents=isolate)
+            result = game.run()
+            self.assertEqual(result["winner"], "Player2")
+            self.assertEqual(result["win_method"], "BAD_MOVE")
+
+    @patch.object(Game, "MAXIMUM_TIME", 10**9 // 2)
+    def test_isolated_agent_killed_on_timeout(self):
+        game = Game(Player("Player1", HangingAgent(Colour.RED)), Player("Player2", FirstEmptyAgent(Colour.BLUE)),
+                    silent=True, isolate_agents=True)
+        result = game.run()
+        self.assertEqual(result["winner"], "Player2")
+        self.assertEqual(result["win_method"], "TIMEOUT")
+        self.assertGreaterEqual(result["player1_move_time"], 0.5)
+
     def test_make_move(self):
         move = Move(0, 0)
         self.game._make_move(move)
@@ -0,0 +1,342 @@
+import csv
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import contextmanager
+from glob import glob
+from multiprocessing import Process
+from time import monotonic, sleep
+from unittest.mock import patch
+
+from HexTournament import (
+    HISTOGRAM_RESOLUTION,
+    GameLeases,
+    MoveTimeHistogram,
+    TournamentManager,
+    TournamentStats,
+    agentClasses,
+    game_keys,
+    init_worker,
+    load_agent_class,
+    merge,
+    parse_shard,
+    play_games,
+    player_names,
+    read_journal,
+    run,
+    serve,
+    work,
+)
+from src.Colour import Colour
+from src.Player import Player
+from test.test_Game import FirstEmptyAgent, HangingAgent
+
+
+@contextmanager
+def in_temporary_directory():
+    """Runs the block in a temporary directory, where the tournament writes
+    its files.
+    """
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            yield directory
+        finally:
+            os.chdir(cwd)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def record_pids():
+    """Appends the pid of the agent's process and of its parent, the worker
+    playing the game, to the file named by HEX_TEST_PIDS.
+    """
+
+    with open(os.environ["HEX_TEST_PIDS"], "a") as pids:
+        pids.write(f"{os.getpid()} {os.getppid()}\n")
+
+
+def read_pids(path: str) -> list[tuple[int, int]]:
+    with open(path) as pids:
+        return [tuple(map(int, line.split())) for line in pids]
+
+
+def is_running(pid: int, wait: float = 5) -> bool:
+    """Whether the process exists and is not a zombie, after waiting up to
+    wait seconds for a process that was just killed to exit.
+    """
+
+    deadline = monotonic() + wait
+    while True:
+        try:
+            with open(f"/proc/{pid}/stat") as stat:
+                running = stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+        except FileNotFoundError:
+            running = False
+        if not running or monotonic() > deadline:
+            return running
+        sleep(0.05)
+
+
+class RecordingAgent(FirstEmptyAgent):
+    def make_move(self, turn, board, opp_move):
+        if turn <= 2:
+            record_pids()
+        return super().make_move(turn, board, opp_move)
+
+
+class RecordingHangingAgent(HangingAgent):
+    def make_move(self, turn, board, opp_move):
+        if turn <= 2:
+            record_pids()
+        return super().make_move(turn, board, opp_move)
+
+
+class TestHexTournament(unittest.TestCase):
+    def test_game_keys_count_repetitions(self):
+        games = [("a", "b"), ("b", "a"), ("a", "b")]
+        self.assertEqual(game_keys(games), [("a", "b", 0), ("b", "a", 0), ("a", "b", 1)])
+
+    def test_read_journal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            journalPath = os.path.join(directory, "journal.jsonl")
+            self.assertEqual(read_journal(journalPath), {})
+
+            result = {"player1": "GroupA", "player2": "GroupB", "winner": "GroupA", "win_method": "WIN"}
+            with open(journalPath, "w") as journal:
+                journal.write(json.dumps({"player1": "a", "player2": "b", "repetition": 0, "result": result}) + "\n")
+                # a line cut short by a crash
+                journal.write('{"player1": "b", "player2"')
+
+            self.assertEqual(read_journal(journalPath), {("a", "b", 0): result})
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        self.assertRaises(ValueError, parse_shard, "4/4")
+        self.assertRaises(ValueError, parse_shard, "1")
+
+    def test_player_names(self):
+        self.assertEqual(player_names(("agents.Group1.A A", "agents.Group2.B B")), ("Group1", "Group2"))
+        agentPair = ("agents.Group1.A A", "agents.Group1.A A X=1")
+        self.assertEqual(player_names(agentPair), agentPair)
+
+    def test_load_agent_class_overrides(self):
+        agentClass = load_agent_class("agents.Group997.NaiveAgent NaiveAgent")
+        tweaked = load_agent_class("agents.Group997.NaiveAgent NaiveAgent EXAMPLE=(1,2)")
+        self.assertTrue(issubclass(tweaked, agentClass))
+        self.assertEqual(tweaked.EXAMPLE, (1, 2))
+        self.assertFalse(hasattr(agentClass, "EXAMPLE"))
+
+        # the tweaked class has no source of its own to hash
+        other = load_agent_class("agents.Group997.NaiveAgent NaiveAgent EXAMPLE=(1,3)")
+        self.assertEqual(hash(tweaked(Colour.RED)), hash(tweaked(Colour.BLUE)))
+        self.assertNotEqual(hash(tweaked(Colour.RED)), hash(other(Colour.RED)))
+        self.assertNotEqual(hash(tweaked(Colour.RED)), hash(agentClass(Colour.RED)))
+        self.assertEqual(Player("A", tweaked(Colour.RED)), Player("A", tweaked(Colour.RED)))
+
+    def test_init_worker_preloads_agents(self):
+        agents = ["agents.Group997.NaiveAgent NaiveAgent", "agents.Group996.Missing Missing"]
+        # the worker's process group and signal handler would apply to the test process
+        with patch.dict(agentClasses, clear=True), patch("HexTournament.startedGames"), \
+                patch("HexTournament.os.setpgid") as setpgid, patch("HexTournament.signal.signal"):
+            with self.assertLogs("HexTournament", level="WARNING") as logs:
+                init_worker(agents, None)
+            self.assertEqual(list(agentClasses), agents[:1])
+            self.assertEqual(agentClasses[agents[0]].__name__, "NaiveAgent")
+        setpgid.assert_called_once_with(0, 0)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("Could not preload agents.Group996.Missing Missing", logs.output[0])
+
+    def test_play_games_pool_arguments(self):
+        agents = ["agents.Group997.NaiveAgent NaiveAgent"]
+        with patch("HexTournament.Pool") as pool:
+            play_games(lambda: None, agents, 5, 1, None, None, None)
+        _, kwargs = pool.call_args
+        self.assertEqual(kwargs["maxtasksperchild"], 5)
+        self.assertIs(kwargs["initializer"], init_worker)
+        self.assertEqual(kwargs["initargs"][0], agents)
+
+    def test_move_time_histogram_percentiles(self):
+        histogram = MoveTimeHistogram()
+        self.assertEqual(histogram.percentile(0.5), 0)
+        for i in range(1, 1001):
+            histogram.add(i / 1000)
+
+        for q in [0.01, 0.5, 0.9, 0.99]:
+            self.assertAlmostEqual(histogram.percentile(q), q, delta=q * HISTOGRAM_RESOLUTION)
+        self.assertLess(len(histogram.buckets), 200)
+
+    def test_tournament_stats(self):
+        stats = TournamentStats()
+        stats.add_result({
+            "player1": "A", "player2": "B", "winner": "A", "win_method": "BAD_MOVE",
+            "player1_move_time": 2.0, "player2_move_time": 1.0, "player1_turns": 4, "player2_turns": 4,
+        })
+        stats.add_result({"player1": "A", "player2": "C", "winner": "A", "win_method": "FAILED_LOAD"})
+
+        self.assertEqual(stats.playerStats["A"]["matches"], 2)
+        self.assertEqual(stats.playerStats["A"]["win_rate"], 1)
+        self.assertEqual(stats.playerStats["A"]["average_move_time"], 0.5)
+        self.assertEqual(stats.playerStats["B"]["illegal_moves_loss"], 1)
+        self.assertEqual(stats.playerStats["C"]["matches"], 0)
+
+    def test_timed_out_games_kill_their_agents(self):
+        hanging = "test.test_HexTournament RecordingHangingAgent"
+        emptyFirst = "test.test_HexTournament FirstEmptyAgent"
+        with in_temporary_directory() as directory:
+            os.environ["HEX_TEST_PIDS"] = os.path.join(directory, "pids")
+            try:
+                run([(hanging, emptyFirst), (emptyFirst, hanging)], timeLimit=2)
+                (errorPath,) = glob("error_game_list_*.log")
+                with open(errorPath) as errorFile:
+                    errors = errorFile.read()
+                pids = read_pids(os.environ["HEX_TEST_PIDS"])
+            finally:
+                del os.environ["HEX_TEST_PIDS"]
+
+        self.assertEqual(errors.count("TimeoutError"), 2)
+        self.assertEqual(len(pids), 2)
+        for agentPid, workerPid in pids:
+            self.assertFalse(is_running(agentPid))
+            self.assertFalse(is_running(workerPid))
+
+    def test_play_games_replaces_timed_out_worker(self):
+        recording = "test.test_HexTournament RecordingAgent"
+        hanging = "test.test_HexTournament RecordingHangingAgent"
+        emptyFirst = "test.test_HexTournament FirstEmptyAgent"
+        games = iter(enumerate([(recording, emptyFirst), (hanging, emptyFirst), (emptyFirst, recording)]))
+        started, results, errors = [], {}, {}
+
+        with tempfile.TemporaryDirectory() as directory:
+            os.environ["HEX_TEST_PIDS"] = os.path.join(directory, "pids")
+            try:
+                # a single worker, which has to be replaced for the last game to be played
+                with patch("HexTournament.os.cpu_count", return_value=1):
+                    play_games(
+                        lambda: next(games, None),
+                        [recording, hanging, emptyFirst],
+                        None,
+                        2,
+                        started.append,
+                        results.__setitem__,
+                        errors.__setitem__,
+                    )
+                pids = read_pids(os.environ["HEX_TEST_PIDS"])
+            finally:
+                del os.environ["HEX_TEST_PIDS"]
+
+        # a game that finishes quickly may be reported before it is seen to start
+        self.assertIn(1, started)
+        self.assertEqual(sorted(results), [0, 2])
+        self.assertEqual(list(errors), [1])
+        self.assertIn("TimeoutError", errors[1])
+
+        # one line per game, from the agent process and the worker that played it
+        (_, firstWorker), (_, hungWorker), (_, lastWorker) = pids
+        self.assertEqual(firstWorker, hungWorker)
+        self.assertNotEqual(lastWorker, hungWorker)
+        for agentPid, _ in pids:
+            self.assertFalse(is_running(agentPid))
+        self.assertFalse(is_running(hungWorker))
+
+    def test_game_leases(self):
+        games = [("a", "b"), ("b", "a"), ("a", "c")]
+        leases = GameLeases(games, [0, 2], 60)
+        self.assertEqual(leases.take(), (0, ("a", "b")))
+        self.assertEqual(leases.take(), (2, ("a", "c")))
+        self.assertEqual(leases.take(), ())
+
+        leases.renew(2, -1)
+        self.assertEqual(leases.expire(), [2])
+        self.assertEqual(leases.take(), (2, ("a", "c")))
+        leases.finish(0)
+        leases.finish(2)
+        self.assertIsNone(leases.take())
+
+        # a game reported after it was handed out again is not handed out a third time
+        leases = GameLeases(games, [1], 60)
+        leases.take()
+        leases.renew(1, -1)
+        leases.expire()
+        leases.finish(1)
+        self.assertIsNone(leases.take())
+
+    def test_connect_requires_auth_key(self):
+        script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "HexTournament.py")
+        node = subprocess.run([sys.executable, script, "--connect", "127.0.0.1:1"], capture_output=True, text=True)
+        self.assertEqual(node.returncode, 2)
+        self.assertIn("--authKey", node.stderr)
+
+    def test_serve_hands_out_games_of_lost_nodes_again(self):
+        emptyFirst = "test.test_HexTournament FirstEmptyAgent"
+        games = [(emptyFirst, emptyFirst)] * 3
+        address = ("127.0.0.1", free_port())
+        authKey = b"test"
+
+        with in_temporary_directory(), patch("HexTournament.NODE_GRACE_PERIOD", 0):
+            coordinator = Process(target=serve, args=(games, address, authKey, 3, "journal.jsonl"))
+            coordinator.start()
+
+            # a node that takes a game and disconnects without playing it
+            TournamentManager.register("get_games")
+            manager = TournamentManager(address=address, authkey=authKey)
+            for _ in range(50):
+                try:
+                    manager.connect()
+                    break
+                except ConnectionRefusedError:
+                    sleep(0.1)
+            lost, _ = manager.get_games().take()
+            del manager
+
+            node = Process(target=work, args=(address, authKey, [emptyFirst], None, 3))
+            node.start()
+            coordinator.join(60)
+            node.join(10)
+            for process in (coordinator, node):
+                if process.is_alive():
+                    process.kill()
+            completed = read_journal("journal.jsonl")
+
+        self.assertEqual(coordinator.exitcode, 0)
+        self.assertEqual(node.exitcode, 0)
+        self.assertEqual(sorted(repetition for _, _, repetition in completed), [0, 1, 2])
+        self.assertIn((emptyFirst, emptyFirst, lost), completed)
+
+    def test_merge(self):
+        result = {
+            "player1": "Group1", "player2": "Group2", "winner": "Group1", "win_method": "WIN",
+            "player1_move_time": 1.0, "player2_move_time": 1.0, "player1_turns": 5, "player2_turns": 4,
+            "total_turns": 9, "total_game_time": 2.0, "swapped": False,
+        }
+        with in_temporary_directory():
+            for journalPath, repetitions in [("shard0.jsonl", [0, 1]), ("shard1.jsonl", [1, 2])]:
+                with open(journalPath, "w") as journal:
+                    for repetition in repetitions:
+                        entry = {"player1": "a", "player2": "b", "repetition": repetition, "result": result}
+                        journal.write(json.dumps(entry) + "\n")
+
+            merge(["shard0.jsonl", "shard1.jsonl"])
+            (resultsPath,) = glob("game_results_*.csv")
+            with open(resultsPath) as resultsFile:
+                rows = list(csv.DictReader(resultsFile))
+            self.assertEqual(len(glob("game_stat_*.csv")), 1)
+            self.assertEqual(len(glob("game_rating_*.csv")), 1)
+
+        # the game both shards journaled is counted once
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row["winner"] for row in rows}, {"Group1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
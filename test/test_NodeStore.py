@@ -0,0 +1,129 @@
+import unittest
+from unittest.mock import patch
+
+from agents.Group17.NodeStore import NodeStore
+
+
+class TestNodeStore(unittest.TestCase):
+    def test_add_child(self):
+        tree = NodeStore(10)
+        root = tree.new_root()
+        for move in [3, 4, 5]:
+            tree.add_child(root, move)
+        self.assertEqual(sorted(tree.move[child] for child in tree.children(root)), [3, 4, 5])
+        self.assertEqual(tree.child_count[root], 3)
+        self.assertEqual([tree.parent[child] for child in tree.children(root)], [root] * 3)
+        self.assertEqual(tree.move[tree.find_child(root, 4)], 4)
+        self.assertEqual(tree.find_child(root, 6), -1)
+        self.assertEqual(tree.children(tree.find_child(root, 4)), [])
+
+    def test_full_store(self):
+        tree = NodeStore(2)
+        root = tree.new_root()
+        self.assertEqual(tree.add_child(root, 1), 1)
+        self.assertEqual(tree.add_child(root, 2), -1)
+        self.assertEqual(tree.child_count[root], 1)
+
+    def test_arrays_grow_up_to_capacity(self):
+        self.assertEqual(NodeStore(1 << 22).length, NodeStore.INITIAL_LENGTH)
+        with patch.object(NodeStore, "INITIAL_LENGTH", 2):
+            tree = NodeStore(5)
+        self.assertEqual(tree.length, 2)
+        node = tree.new_root()
+        for move in range(4):
+            tree.visits[node] = move + 1
+            node = tree.add_child(node, move)
+        self.assertEqual((tree.size, tree.length), (5, 5))
+        self.assertEqual(tree.add_child(node, 4), -1)
+        self.assertEqual([tree.visits[node] for node in range(5)], [1, 2, 3, 4, 0])
+        self.assertEqual([tree.parent[node] for node in range(5)], [-1, 0, 1, 2, 3])
+        self.assertEqual([tree.first_child[node] for node in range(5)], [1, 2, 3, 4, -1])
+
+    def test_new_root_clears_statistics(self):
+        tree = NodeStore(4)
+        root = tree.new_root()
+        child = tree.add_child(root, 1)
+        tree.add_child(child, 2)
+        tree.visits[child] = 5
+        root = tree.new_root()
+        child = tree.add_child(root, 7)
+        self.assertEqual(tree.visits[child], 0)
+        self.assertEqual(tree.children(child), [])
+
+    def test_keep_subtree(self):
+        tree = NodeStore(20)
+        root = tree.new_root()
+        tree.add_child(root, 0)
+        kept = tree.add_child(root, 1)
+        for move in [10, 11, 12]:
+            child = tree.add_child(kept, move)
+            if move == 11:
+                tree.add_child(child, 20)
+                tree.untried[child] = [21, 22]
+                tree.visits[child] = 7
+                tree.value[child] = 3
+                tree.amaf_visits[child] = 9
+                tree.amaf_value[child] = 4
+
+        tree.untried[root] = [2]
+        tree.untried[kept] = []
+        root = tree.keep_subtree(kept)
+        self.assertEqual(root, 0)
+        self.assertEqual(tree.size, 5)
+        self.assertEqual(tree.parent[root], -1)
+        self.assertEqual(sorted(tree.move[child] for child in tree.children(root)), [10, 11, 12])
+        child = tree.find_child(root, 11)
+        self.assertEqual((tree.visits[child], tree.value[child]), (7, 3))
+        self.assertEqual((tree.amaf_visits[child], tree.amaf_value[child]), (9, 4))
+        self.assertEqual([tree.move[grandchild] for grandchild in tree.children(child)], [20])
+        self.assertEqual(tree.untried, {root: [], child: [21, 22]})
+        self.assertEqual(tree.parent[tree.first_child[child]], child)
+
+    def test_transpositions_share_statistics(self):
+        tree = NodeStore(10)
+        root = tree.new_root(1)
+        a = tree.add_child(root, 0, 2)
+        b = tree.add_child(root, 1, 3)
+        ab = tree.add_child(a, 1, 4)
+        ba = tree.add_child(b, 0, 4)
+        self.assertEqual(tree.share[ba], ab)
+        self.assertEqual([tree.share[node] for node in (root, a, b, ab)], [root, a, b, ab])
+        self.assertEqual(tree.share[tree.add_child(root, 2)], tree.size - 1)
+
+    def test_transposition_table_evicts_oldest(self):
+        tree = NodeStore(10, max_transpositions=2)
+        root = tree.new_root(1)
+        a = tree.add_child(root, 0, 2)
+        b = tree.add_child(root, 1, 3)
+        self.assertEqual(list(tree.table), [2, 3])
+        # the root's entry was evicted, so its key is no longer shared
+        self.assertNotEqual(tree.share[tree.add_child(a, 5, 1)], root)
+        self.assertEqual(tree.share[tree.add_child(a, 6, 3)], b)
+
+    def test_keep_subtree_moves_shared_statistics(self):
+        tree = NodeStore(20)
+        root = tree.new_root(1)
+        a = tree.add_child(root, 0, 2)
+        kept = tree.add_child(root, 1, 3)
+        ab = tree.add_child(a, 1, 4)
+        ba = tree.add_child(kept, 0, 4)
+        bac = tree.add_child(ba, 2, 5)
+        bc = tree.add_child(kept, 2, 6)
+        bca = tree.add_child(bc, 0, 5)
+        tree.visits[ab], tree.value[ab] = 6, 2
+        tree.visits[bac], tree.value[bac] = 3, 1
+
+        root = tree.keep_subtree(kept)
+        ba = tree.find_child(root, 0)
+        bac = tree.find_child(ba, 2)
+        bca = tree.find_child(tree.find_child(root, 2), 0)
+        # the statistics of the dropped node ab are taken over by ba
+        self.assertEqual(tree.share[ba], ba)
+        self.assertEqual((tree.visits[ba], tree.value[ba]), (6, 2))
+        self.assertEqual(tree.share[bca], bac)
+        self.assertEqual((tree.visits[bac], tree.value[bac]), (3, 1))
+        self.assertEqual(tree.table, {3: root, 4: ba, 5: bac, 6: tree.find_child(root, 2)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import random
+import unittest
+from math import exp
+
+from src.Rating import ELO_PER_LOGIT, Rating
+
+
+def result(player1, player2, player1Wins, swapped=False, winMethod="WIN"):
+    return {
+        "player1": player1,
+        "player2": player2,
+        "winner": player1 if player1Wins else player2,
+        "win_method": winMethod,
+        "swapped": swapped,
+    }
+
+
+class TestRating(unittest.TestCase):
+    def test_even_players_rate_equal(self):
+        rating = Rating()
+        for player1Wins in [True, False, True, False]:
+            rating.add_result(result("a", "b", player1Wins))
+            rating.add_result(result("b", "a", player1Wins))
+
+        ratings = rating.ratings()
+        self.assertAlmostEqual(ratings["a"][0], 0)
+        self.assertAlmostEqual(ratings["b"][0], 0)
+        self.assertAlmostEqual(rating.red_advantage()[0], 0)
+
+    def test_stronger_player_rates_higher(self):
+        rating = Rating()
+        for _ in range(3):
+            rating.add_result(result("a", "b", True))
+            rating.add_result(result("b", "a", False))
+        rating.add_result(result("a", "b", False))
+
+        ratings = rating.ratings()
+        self.assertGreater(ratings["a"][0], 0)
+        self.assertAlmostEqual(ratings["a"][0], -ratings["b"][0])
+
+    def test_recovers_simulated_parameters(self):
+        rng = random.Random(0)
+        strengths = {"a": 1.0, "b": 0.0, "c": -1.0}
+        redAdvantage, swapAdvantage = 0.5, 0.25
+
+        rating = Rating()
+        for _ in range(1000):
+            player1, player2 = rng.sample(sorted(strengths), 2)
+            swapped = rng.random() < 0.3
+            z = strengths[player1] - strengths[player2]
+            z += -swapAdvantage if swapped else redAdvantage
+            rating.add_result(result(player1, player2, rng.random() < 1 / (1 + exp(-z)), swapped))
+
+        ratings = rating.ratings()
+        for player, strength in strengths.items():
+            elo, width = ratings[player]
+            self.assertLess(abs(elo - ELO_PER_LOGIT * strength), width)
+        elo, width = rating.red_advantage()
+        self.assertLess(abs(elo - ELO_PER_LOGIT * redAdvantage), width)
+        elo, width = rating.swap_advantage()
+        self.assertLess(abs(elo - ELO_PER_LOGIT * swapAdvantage), width)
+
+    def test_incremental_fit_matches_batch_fit(self):
+        rng = random.Random(1)
+        results = [result(*rng.sample("abcd", 2), rng.random() < 0.6, rng.random() < 0.2) for _ in range(200)]
+
+        incremental = Rating()
+        for r in results:
+            incremental.add_result(r)
+            incremental.fit()
+        batch = Rating()
+        for r in results:
+            batch.add_result(r)
+
+        for player, (elo, width) in batch.ratings().items():
+            self.assertAlmostEqual(incremental.ratings()[player][0], elo, places=6)
+            self.assertAlmostEqual(incremental.ratings()[player][1], width, places=6)
+
+    def test_undefeated_player_has_finite_rating(self):
+        rating = Rating()
+        for _ in range(5):
+            rating.add_result(result("a", "b", True))
+            rating.add_result(result("b", "a", False))
+
+        elo, width = rating.ratings()["a"]
+        self.assertGreater(elo, 0)
+        self.assertLess(elo, float("inf"))
+
+    def test_failed_load_is_ignored(self):
+        rating = Rating()
+        rating.add_result(result("a", "b", True, winMethod="FAILED_LOAD"))
+        self.assertEqual(rating.ratings(), {})
+        self.assertFalse(rating.has_converged(1000))
+
+    def test_confidence_narrows_with_games(self):
+        rating = Rating()
+        for player1Wins in [True, False]:
+            rating.add_result(result("a", "b", player1Wins))
+            rating.add_result(result("b", "a", player1Wins))
+        width = rating.ratings()["a"][1]
+        self.assertFalse(rating.has_converged(width / 2))
+
+        for player1Wins in [True, False] * 50:
+            rating.add_result(result("a", "b", player1Wins))
+            rating.add_result(result("b", "a", player1Wins))
+        self.assertLess(rating.ratings()["a"][1], width / 2)
+        self.assertTrue(rating.has_converged(width / 2))
+
+    def test_reads_swapped_from_csv(self):
+        rating = Rating()
+        rating.add_result(result("a", "b", True, swapped="True"))
+        rating.add_result(result("a", "b", True, swapped="False"))
+        self.assertEqual(set(key[2] for key in rating._counts), {True, False})
+
+
+if __name__ == "__main__":
+    unittest.main()
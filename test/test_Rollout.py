@@ -0,0 +1,39 @@
+import random
+import unittest
+
+from agents.Group17.Rollout import Rollout
+from src.Board import Board
+from src.Colour import Colour
+
+
+class TestRollout(unittest.TestCase):
+    def test_fills_the_empty_tiles(self):
+        state = [[None] * 11 for _ in range(11)]
+        state[5][5] = Colour.RED
+        state[4][6] = Colour.BLUE
+        state[0][0] = Colour.BLUE
+        rollout = Rollout()
+        rollout.play(state, Colour.RED)
+        cells = rollout.cells[:121]
+        self.assertEqual((cells[5 * 11 + 5], cells[4 * 11 + 6], cells[0]), (Colour.RED, Colour.BLUE, Colour.BLUE))
+        # red moves first among the 118 empty tiles, so each colour plays 59 of them
+        self.assertEqual((cells.count(Colour.RED), cells.count(Colour.BLUE)), (60, 61))
+        self.assertIsNone(state[0][1])
+
+    def test_winner_agrees_with_the_board(self):
+        random.seed(2)
+        for size in (1, 3, 11):
+            rollout = Rollout(size)
+            state = [[None] * size for _ in range(size)]
+            for _ in range(100):
+                red_won = rollout.play(state, random.choice([Colour.RED, Colour.BLUE]))
+                board = Board(size)
+                for tile, colour in enumerate(rollout.cells[:size * size]):
+                    board.set_tile_colour(tile // size, tile % size, colour)
+                self.assertEqual(board.has_ended(Colour.RED), red_won)
+                # a full board always has a winner
+                self.assertTrue(board.has_ended(Colour.BLUE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import random
+import unittest
+
+from src.SPRT import SPRT, elo_to_score
+
+
+class TestSPRT(unittest.TestCase):
+    def test_elo_to_score(self):
+        self.assertAlmostEqual(elo_to_score(0), 0.5)
+        self.assertAlmostEqual(elo_to_score(400), 10 / 11)
+        self.assertAlmostEqual(elo_to_score(-100) + elo_to_score(100), 1)
+
+    def test_undecided_without_games(self):
+        sprt = SPRT()
+        self.assertEqual(sprt.llr, 0)
+        self.assertEqual(sprt.status(), "")
+        self.assertEqual(sprt.elo(), 0)
+
+    def test_accepts_stronger_player(self):
+        rng = random.Random(0)
+        sprt = SPRT(0, 50)
+        while not sprt.status():
+            sprt.add_game(rng.random() < elo_to_score(100))
+        self.assertEqual(sprt.status(), "H1")
+        self.assertGreater(sprt.elo(), 0)
+
+    def test_rejects_equal_player(self):
+        rng = random.Random(0)
+        sprt = SPRT(0, 50)
+        while not sprt.status():
+            sprt.add_game(rng.random() < 0.5)
+        self.assertEqual(sprt.status(), "H0")
+
+    def test_win_and_loss_move_llr_apart(self):
+        sprt = SPRT(0, 10)
+        sprt.add_game(True)
+        self.assertGreater(sprt.llr, 0)
+        sprt.add_game(False)
+        # a win and a loss favour the weaker hypothesis
+        self.assertLess(sprt.llr, 0)
+
+    def test_invalid_hypotheses(self):
+        self.assertRaises(ValueError, SPRT, 10, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()